@@ -1,11 +1,29 @@
+import base64
+import cProfile
+import gzip
+import hmac
 import html
+import io
+import itertools
+import json
+import pstats
+import queue
+import random
 import re
 import sqlite3
-from datetime import datetime, UTC
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import Future
+from datetime import datetime, timedelta, UTC
 from pathlib import Path
-from typing import List, Dict
-from flask import Flask, request, redirect, url_for, render_template_string, flash
+from typing import Dict, Iterable, Iterator, List
+import click
+from flask import (Flask, request, redirect, url_for, render_template_string, flash, abort, has_request_context,
+                   g, send_from_directory, stream_with_context)
 from dotenv import load_dotenv
+import recipe_query
+from recipe_catalog import RecipeCatalog
 import os
 load_dotenv()
 
@@ -16,43 +34,502 @@ DEBUG_MODE = os.getenv("FLASK_DEBUG", "0") == "1"
 
 
 APP_TITLE = "Spicy Recipe Logger"
-DB_PATH = Path(__file__).with_suffix("") / "recipes.db"
-DB_PATH.parent.mkdir(parents=True, exist_ok=True)
+DB_PATH = Path(os.getenv("RECIPES_DB") or Path(__file__).with_suffix("") / "recipes.db")
+WRITE_WINDOW_MS = float(os.getenv("WRITE_WINDOW_MS", "2"))  # group-commit window
+CHANGE_RETENTION_DAYS = float(os.getenv("CHANGE_RETENTION_DAYS", "30"))  # tombstone lifetime
+API_COLUMNS = "id,title,cuisine,mood,spice_level,rating,tags,vegetarian,tried,created_at"
+# Multi-tenant mode: each tenant gets its own SQLite file under TENANT_DIR,
+# picked from a request header or a subdomain of TENANT_DOMAIN.
+TENANT_MODE = os.getenv("TENANT_MODE", "")  # '', 'header' or 'subdomain'
+TENANT_HEADER = os.getenv("TENANT_HEADER", "X-Tenant")
+TENANT_DOMAIN = os.getenv("TENANT_DOMAIN", "").lower()  # e.g. recipes.example.com
+TENANT_DIR = Path(os.getenv("TENANT_DIR") or DB_PATH.parent / "tenants")
+TENANT_ALLOWLIST = {t.strip().lower() for t in os.getenv("TENANT_ALLOWLIST", "").split(",") if t.strip()}
+DB_POOL_SIZE = int(os.getenv("DB_POOL_SIZE", "16"))  # open connections kept per thread
+RECIPE_CATALOG = os.getenv("RECIPE_CATALOG", "0") == "1"  # in-memory list filtering, see recipe_catalog
+CATALOG_CACHE_SIZE = int(os.getenv("CATALOG_CACHE_SIZE", "8"))  # catalogs kept per worker (one per database)
+ADMIN_TOKEN = os.getenv("ADMIN_TOKEN", "")  # unset = admin pages and ?__profile=1 disabled
+PROFILE_DIR = Path(os.getenv("PROFILE_DIR") or DB_PATH.parent / "profiles")
+PROFILE_KEEP = int(os.getenv("PROFILE_KEEP", "50"))  # newest .prof files kept
+PROFILE_SAMPLE_RATE = float(os.getenv("PROFILE_SAMPLE_RATE", "0"))  # fraction of requests profiled
+IMPORT_MAX_MB = float(os.getenv("IMPORT_MAX_MB", "64"))  # cap on an import, uploaded and decompressed
+IMPORT_BATCH_SIZE = int(os.getenv("IMPORT_BATCH_SIZE", "500"))  # recipes per write transaction
+app.config["MAX_CONTENT_LENGTH"] = int(IMPORT_MAX_MB * 1024 * 1024)
+JOURNAL_MODE = os.getenv("SQLITE_JOURNAL_MODE", "wal").lower()  # readers and the backup never block writers
+SNAPSHOT_DIR = Path(os.getenv("SNAPSHOT_DIR") or DB_PATH.parent / "snapshots")
+SNAPSHOT_KEEP = int(os.getenv("SNAPSHOT_KEEP", "10"))  # newest snapshots kept per database
+SNAPSHOT_PAGES = int(os.getenv("SNAPSHOT_PAGES", "256"))  # pages copied per backup step
+SNAPSHOT_SLEEP_MS = float(os.getenv("SNAPSHOT_SLEEP_MS", "10"))  # pause between steps
 
 
 # ----------------------- DB Utils -----------------------
-def get_db():
-    conn = sqlite3.connect(DB_PATH)
+TENANT_RE = re.compile(r"^[a-z0-9][a-z0-9_-]{0,62}$")
+_pool = threading.local()
+_ready_tenants = set()
+
+
+def _connect(path):
+    conn = sqlite3.connect(path)
     conn.row_factory = sqlite3.Row
     return conn
 
 
-def init_db():
-    with get_db() as db:
+def current_tenant():
+    """Tenant named by the request, or None outside tenant mode / without one."""
+    if not TENANT_MODE or not has_request_context():
+        return None
+    if TENANT_MODE == "subdomain":
+        host = request.host.split(":")[0].lower()
+        suffix = "." + TENANT_DOMAIN
+        name = host[: -len(suffix)] if TENANT_DOMAIN and host.endswith(suffix) else ""
+    else:
+        name = request.headers.get(TENANT_HEADER, "")
+    name = name.strip().lower()
+    if not name:
+        return None
+    if not TENANT_RE.match(name):
+        abort(400, description="Invalid tenant name")
+    return name
+
+
+def current_db_path() -> Path:
+    """The database this request works on; a tenant's file is migrated on first use.
+
+    Only provisioned tenants (an existing file, see `flask tenant create`) or
+    names in TENANT_ALLOWLIST get a database; anything else is a 404, so
+    clients cannot create files by inventing tenant names.
+    """
+    tenant = current_tenant()
+    if tenant is None:
+        return DB_PATH
+    path = TENANT_DIR / f"{tenant}.db"
+    if path not in _ready_tenants:
+        if tenant not in TENANT_ALLOWLIST and not path.is_file():
+            abort(404, description="Unknown tenant")
+        init_db(path)
+        _ready_tenants.add(path)
+    return path
+
+
+def get_db(path: Path = None):
+    """Open connection for `path` (default: current_db_path()).
+
+    Connections are kept per thread in an LRU of DB_POOL_SIZE handles; the
+    least recently used one is closed when a new file needs a slot. Callers use
+    `with get_db() as db:` for commit/rollback and must not close the handle.
+    """
+    key = str(path or current_db_path())
+    if getattr(_pool, "pid", None) != os.getpid():
+        # never reuse handles inherited across a fork
+        _pool.conns, _pool.pid = OrderedDict(), os.getpid()
+    conns = _pool.conns
+    conn = conns.get(key)
+    if conn is None:
+        conn = conns[key] = _connect(key)
+        while len(conns) > DB_POOL_SIZE:
+            conns.popitem(last=False)[1].close()
+    else:
+        conns.move_to_end(key)
+    return conn
+
+
+# ----------------------- Writer -----------------------
+def _is_lock_error(exc: Exception) -> bool:
+    return isinstance(exc, sqlite3.OperationalError) and ("locked" in str(exc) or "busy" in str(exc))
+
+
+class DbWriter:
+    """Runs every write of this process to one database file on one thread and group-commits bursts.
+
+    submit(fn) queues fn(db) and blocks until its transaction commits, then
+    returns fn's result. Jobs arriving within `window` seconds share one
+    transaction; each runs inside its own savepoint, so a job that raises is
+    rolled back alone and the exception is re-raised in its caller. Jobs must
+    not commit themselves. Lock contention with other processes is retried
+    with jittered exponential backoff. The thread exits after `idle` seconds
+    without work and is restarted by the next submit.
+    """
+
+    def __init__(self, path: Path, window: float, max_batch: int = 64, retries: int = 8, idle: float = 60):
+        self.path = path
+        self.window = window
+        self.idle = idle
+        self.max_batch = max_batch
+        self.retries = retries
+        self._start_lock = threading.Lock()
+        self._queue = None
+        self._pid = None
+        self.commits = 0
+        self.jobs = 0
+        self.lock_retries = 0
+        self.failed_commits = 0
+        self.last_commit_ms = 0.0
+        self.max_commit_ms = 0.0
+        self.total_commit_ms = 0.0
+
+    def submit(self, fn):
+        fut = Future()
+        with self._start_lock:
+            # started lazily, again in each forked gunicorn worker, and after idling out
+            if self._pid != os.getpid():
+                self._queue = queue.Queue()
+                threading.Thread(target=self._run, args=(self._queue,), name="db-writer", daemon=True).start()
+                self._pid = os.getpid()
+            self._queue.put((fn, fut))
+        return fut.result()
+
+    def stats(self) -> Dict:
+        return {
+            "queue_depth": self._queue.qsize() if self._queue else 0,
+            "commits": self.commits,
+            "jobs": self.jobs,
+            "avg_batch": round(self.jobs / self.commits, 2) if self.commits else None,
+            "lock_retries": self.lock_retries,
+            "failed_commits": self.failed_commits,
+            "last_commit_ms": round(self.last_commit_ms, 3),
+            "avg_commit_ms": round(self.total_commit_ms / self.commits, 3) if self.commits else None,
+            "max_commit_ms": round(self.max_commit_ms, 3),
+        }
+
+    def _run(self, jobs: queue.Queue):
+        try:
+            while True:
+                try:
+                    batch = [jobs.get(timeout=self.idle)]
+                except queue.Empty:
+                    with self._start_lock:
+                        if jobs.empty():
+                            self._pid = None
+                            return
+                    continue
+                deadline = time.monotonic() + self.window
+                while len(batch) < self.max_batch:
+                    try:
+                        batch.append(jobs.get(timeout=max(0.0, deadline - time.monotonic())))
+                    except queue.Empty:
+                        break
+                try:
+                    self._commit(batch)
+                except Exception as exc:  # e.g. the file cannot be opened; fail the batch, keep serving
+                    self.failed_commits += 1
+                    for _, fut in batch:
+                        if not fut.done():
+                            fut.set_exception(exc)
+        finally:
+            # if the thread dies anyway, nobody may wait on it: fail what is queued, restart on next submit
+            with self._start_lock:
+                if self._queue is jobs:
+                    self._pid = None
+                while not jobs.empty():
+                    _, fut = jobs.get_nowait()
+                    fut.set_exception(RuntimeError("database writer stopped"))
+
+    def _commit(self, batch):
+        started = time.perf_counter()
+        delay = 0.01
+        db = get_db(self.path)
+        for attempt in range(self.retries + 1):
+            try:
+                db.execute("BEGIN IMMEDIATE")
+                results = [self._apply(db, fn) for fn, _ in batch]
+                db.commit()
+                break
+            except Exception as exc:
+                try:
+                    db.rollback()
+                except sqlite3.Error:
+                    pass  # the failure below is what callers need to see
+                if not _is_lock_error(exc) or attempt == self.retries:
+                    self.failed_commits += 1
+                    for _, fut in batch:
+                        fut.set_exception(exc)
+                    return
+                self.lock_retries += 1
+                time.sleep(delay * (1 + random.random()))
+                delay = min(delay * 2, 1.0)
+
+        elapsed_ms = (time.perf_counter() - started) * 1000
+        self.commits += 1
+        self.jobs += len(batch)
+        self.last_commit_ms = elapsed_ms
+        self.total_commit_ms += elapsed_ms
+        self.max_commit_ms = max(self.max_commit_ms, elapsed_ms)
+        for (_, fut), (result, exc) in zip(batch, results):
+            if exc is None:
+                fut.set_result(result)
+            else:
+                fut.set_exception(exc)
+
+    @staticmethod
+    def _apply(db, fn):
+        db.execute("SAVEPOINT job")
+        try:
+            result = fn(db)
+        except Exception as exc:
+            if _is_lock_error(exc):
+                raise  # retry the whole batch
+            db.execute("ROLLBACK TO job")
+            db.execute("RELEASE job")
+            return None, exc
+        db.execute("RELEASE job")
+        return result, None
+
+
+_writers: Dict[str, DbWriter] = {}
+_writers_lock = threading.Lock()
+
+
+def writer_for(path: Path = None) -> DbWriter:
+    """The writer for `path` (default: current_db_path()); one per database file."""
+    key = str(path or current_db_path())
+    w = _writers.get(key)
+    if w is None:
+        with _writers_lock:
+            w = _writers.setdefault(key, DbWriter(Path(key), window=WRITE_WINDOW_MS / 1000))
+    return w
+
+
+# ----------------------- Migrations -----------------------
+# Ordered schema steps; PRAGMA user_version records how many have been applied.
+# Append new steps at the end and never edit or reorder released ones.
+MIGRATIONS: List = []
+
+
+def migration(fn):
+    MIGRATIONS.append(fn)
+    return fn
+
+
+@migration
+def _create_recipes(db):
+    # Databases from before user_version tracking already have the table,
+    # possibly without the vegetarian/tried columns.
+    db.execute(
+        """
+        CREATE TABLE IF NOT EXISTS recipes (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            title TEXT NOT NULL,
+            cuisine TEXT,
+            mood TEXT,
+            ingredients TEXT,
+            instructions TEXT,
+            spice_level INTEGER,
+            rating INTEGER,
+            tags TEXT,
+            source TEXT,
+            created_at TEXT NOT NULL
+        )
+        """
+    )
+    cols = {row["name"] for row in db.execute("PRAGMA table_info(recipes)")}
+    if "vegetarian" not in cols:
+        db.execute("ALTER TABLE recipes ADD COLUMN vegetarian INTEGER DEFAULT NULL")  # 0/1/NULL
+    if "tried" not in cols:
+        db.execute("ALTER TABLE recipes ADD COLUMN tried INTEGER DEFAULT NULL")
+
+
+@migration
+def _create_maintenance_checkpoints(db):
+    # resume points for `flask maintenance run`
+    db.execute(
+        """
+        CREATE TABLE IF NOT EXISTS maintenance_checkpoints (
+            task TEXT PRIMARY KEY,
+            position INTEGER NOT NULL,
+            updated_at TEXT NOT NULL
+        )
+        """
+    )
+
+
+# Summary rows behind /api/stats. NULL cuisine is keyed as '' and a missing
+# spice level as -1 so that both can be primary keys.
+STATS_FROM_RECIPES = {
+    "stats_cuisine": """
+        SELECT IFNULL(cuisine, '') AS cuisine, COUNT(*) AS recipes, IFNULL(SUM(rating), 0) AS rating_sum,
+               COUNT(rating) AS rated, SUM(IFNULL(tried, 0) <> 0) AS tried
+          FROM recipes GROUP BY 1
+    """,
+    # only set levels; /api/stats derives the unset bucket from the cuisine totals
+    "stats_spice": """
+        SELECT spice_level, COUNT(*) AS recipes FROM recipes WHERE spice_level IS NOT NULL GROUP BY 1
+    """,
+}
+
+
+def _stats_delta(ref: str, sign: str) -> str:
+    """Trigger statements adding (sign '+') or removing (sign '-') row `ref` from the summaries."""
+    cuisine, spice = f"IFNULL({ref}.cuisine, '')", f"{ref}.spice_level"
+    sql = f"""
+        INSERT OR IGNORE INTO stats_cuisine(cuisine) VALUES ({cuisine});
+        UPDATE stats_cuisine
+           SET recipes = recipes {sign} 1,
+               rating_sum = rating_sum {sign} IFNULL({ref}.rating, 0),
+               rated = rated {sign} ({ref}.rating IS NOT NULL),
+               tried = tried {sign} (IFNULL({ref}.tried, 0) <> 0)
+         WHERE cuisine = {cuisine};
+        INSERT OR IGNORE INTO stats_spice(spice_level) SELECT {spice} WHERE {spice} IS NOT NULL;
+        UPDATE stats_spice SET recipes = recipes {sign} 1 WHERE spice_level = {spice};
+    """
+    if sign == "-":
+        sql += f"""
+        DELETE FROM stats_cuisine WHERE cuisine = {cuisine} AND recipes = 0;
+        DELETE FROM stats_spice WHERE spice_level = {spice} AND recipes = 0;
+        """
+    return sql
+
+
+def rebuild_stats(db):
+    """Recompute the summary tables from scratch (inside the caller's transaction)."""
+    for table, query in STATS_FROM_RECIPES.items():
+        db.execute(f"DELETE FROM {table}")
+        db.execute(f"INSERT INTO {table} {query}")
+
+
+@migration
+def _create_stats(db):
+    db.execute(
+        """
+        CREATE TABLE stats_cuisine (
+            cuisine TEXT PRIMARY KEY,
+            recipes INTEGER NOT NULL DEFAULT 0,
+            rating_sum INTEGER NOT NULL DEFAULT 0,
+            rated INTEGER NOT NULL DEFAULT 0,
+            tried INTEGER NOT NULL DEFAULT 0
+        )
+        """
+    )
+    db.execute(
+        """
+        CREATE TABLE stats_spice (
+            spice_level INTEGER PRIMARY KEY,
+            recipes INTEGER NOT NULL DEFAULT 0
+        )
+        """
+    )
+    _create_stats_triggers(db)
+    rebuild_stats(db)
+
+
+def _create_stats_triggers(db):
+    db.execute(f"CREATE TRIGGER recipes_stats_ai AFTER INSERT ON recipes BEGIN {_stats_delta('NEW', '+')} END")
+    db.execute(f"CREATE TRIGGER recipes_stats_ad AFTER DELETE ON recipes BEGIN {_stats_delta('OLD', '-')} END")
+    db.execute(
+        "CREATE TRIGGER recipes_stats_au AFTER UPDATE OF cuisine, rating, tried, spice_level ON recipes "
+        f"BEGIN {_stats_delta('OLD', '-')} {_stats_delta('NEW', '+')} END"
+    )
+
+
+@migration
+def _create_change_log(db):
+    # One row per recipe: its latest upsert or its tombstone. Triggers drop the
+    # previous entry for the recipe, so the log stays as large as the catalog
+    # plus unexpired tombstones. AUTOINCREMENT keeps seq monotonic.
+    db.execute(
+        """
+        CREATE TABLE recipe_changes (
+            seq INTEGER PRIMARY KEY AUTOINCREMENT,
+            recipe_id INTEGER NOT NULL,
+            op TEXT NOT NULL,
+            changed_at TEXT NOT NULL
+        )
+        """
+    )
+    db.execute("CREATE INDEX idx_recipe_changes_recipe ON recipe_changes(recipe_id)")
+    # seq at or below compacted_through may have lost tombstones
+    db.execute(
+        """
+        CREATE TABLE change_log_state (
+            id INTEGER PRIMARY KEY CHECK (id = 1),
+            compacted_through INTEGER NOT NULL
+        )
+        """
+    )
+    db.execute("INSERT INTO change_log_state VALUES (1, 0)")
+    for event, ref, op in (("INSERT", "NEW", "upsert"), ("UPDATE", "NEW", "upsert"), ("DELETE", "OLD", "delete")):
         db.execute(
-            """
-            CREATE TABLE IF NOT EXISTS recipes (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                title TEXT NOT NULL,
-                cuisine TEXT,
-                mood TEXT,
-                ingredients TEXT,
-                instructions TEXT,
-                spice_level INTEGER,
-                rating INTEGER,
-                tags TEXT,
-                source TEXT,
-                created_at TEXT NOT NULL
-            )
+            f"""
+            CREATE TRIGGER recipes_changes_{event.lower()} AFTER {event} ON recipes BEGIN
+                DELETE FROM recipe_changes WHERE recipe_id = {ref}.id;
+                INSERT INTO recipe_changes(recipe_id, op, changed_at)
+                VALUES ({ref}.id, '{op}', strftime('%Y-%m-%dT%H:%M:%fZ', 'now'));
+            END
             """
         )
-        # add vegetarian, tried if missing
-        cols = {row["name"] for row in db.execute("PRAGMA table_info(recipes)")}
-        if "vegetarian" not in cols:
-            db.execute("ALTER TABLE recipes ADD COLUMN vegetarian INTEGER DEFAULT NULL")  # 0/1/NULL
-        if "tried" not in cols:
-            db.execute("ALTER TABLE recipes ADD COLUMN tried INTEGER DEFAULT NULL")
+    db.execute(
+        "INSERT INTO recipe_changes(recipe_id, op, changed_at) SELECT id, 'upsert', created_at FROM recipes ORDER BY id"
+    )
+
+
+@migration
+def _create_list_indexes(db):
+    # filter ranges and sort orders used by recipe_query
+    db.execute("CREATE INDEX idx_recipes_created_at ON recipes(created_at)")
+    db.execute("CREATE INDEX idx_recipes_title ON recipes(title COLLATE NOCASE)")
+    db.execute("CREATE INDEX idx_recipes_cuisine ON recipes(cuisine)")
+    db.execute("CREATE INDEX idx_recipes_cuisine_sort ON recipes(IFNULL(cuisine, '') COLLATE NOCASE)")
+    db.execute("CREATE INDEX idx_recipes_spice ON recipes(spice_level)")
+    db.execute("CREATE INDEX idx_recipes_rating ON recipes(rating)")
+
+
+@migration
+def _create_import_dedupe_index(db):
+    # the importer's duplicate check: title = ? AND IFNULL(cuisine, '') = ?
+    db.execute("CREATE INDEX idx_recipes_title_cuisine ON recipes(title, IFNULL(cuisine, ''))")
+
+
+@migration
+def _stats_spice_without_sentinel(db):
+    # stats_spice used to key unset levels as -1, which a stored -1 shares
+    for trigger in ("recipes_stats_ai", "recipes_stats_ad", "recipes_stats_au"):
+        db.execute(f"DROP TRIGGER {trigger}")
+    _create_stats_triggers(db)
+    rebuild_stats(db)
+
+
+def schema_version(db) -> int:
+    return db.execute("PRAGMA user_version").fetchone()[0]
+
+
+def migrate(db) -> int:
+    """Apply pending migrations under an exclusive lock and return the new version.
+
+    Workers that start together queue on the lock; whoever gets it second sees
+    the bumped user_version and has nothing left to do.
+    """
+    db.execute("PRAGMA busy_timeout = 30000")
+    db.execute("BEGIN EXCLUSIVE")
+    try:
+        version = schema_version(db)
+        for step in MIGRATIONS[version:]:
+            step(db)
+        if version < len(MIGRATIONS):
+            db.execute(f"PRAGMA user_version = {len(MIGRATIONS)}")
         db.commit()
+    except Exception:
+        db.rollback()
+        raise
+    return len(MIGRATIONS)
+
+
+def init_db(path: Path = None):
+    """Bring a database (default DB_PATH) up to date; a current one costs two PRAGMA reads."""
+    path = path or DB_PATH
+    if not path.parent.is_dir():
+        path.parent.mkdir(parents=True, exist_ok=True)
+    # a private handle, so nothing opened here leaks into the connection pool or a fork
+    db = _connect(path)
+    try:
+        if schema_version(db) < len(MIGRATIONS):
+            migrate(db)
+        if db.execute("PRAGMA journal_mode").fetchone()[0] != JOURNAL_MODE:
+            # persistent; if another worker holds the file this start keeps the old mode and the next one retries
+            try:
+                db.execute(f"PRAGMA journal_mode = {JOURNAL_MODE}")
+            except sqlite3.OperationalError:
+                pass
+    finally:
+        db.close()
 
 
 # Initialize the DB at import time (Flask 3.x safe)
@@ -157,6 +634,26 @@ def parse_markdown_collection(md_text: str) -> List[Dict]:
     return recipes
 
 
+def iter_markdown_sections(lines: Iterable[str]) -> Iterator[str]:
+    """Group lines into one '### n. Title' section at a time; text before the first header is dropped."""
+    section: List[str] = []
+    for line in lines:
+        if SECTION_RE.match(line):
+            if section:
+                yield "".join(section)
+            section = [line]
+        elif section:
+            section.append(line)
+    if section:
+        yield "".join(section)
+
+
+def iter_markdown_collection(lines: Iterable[str]) -> Iterator[Dict]:
+    """parse_markdown_collection() for a stream: only one section is held in memory."""
+    for section in iter_markdown_sections(lines):
+        yield from parse_markdown_collection(section)
+
+
 # ----------------------- HTML Base -----------------------
 BASE_HTML = """
 <!doctype html>
@@ -237,7 +734,6 @@ BASE_HTML = """
 
     /* Swiper tweaks */
     .swiper { padding: 4px 4px 24px; }
-    .swiper-slide { width: 320px; } /* auto-like width; tweak as needed */
     .swiper-button-prev, .swiper-button-next { color: var(--ink); }
     [data-theme="charcoal"] .swiper-button-prev, [data-theme="charcoal"] .swiper-button-next { color: #e9edf5; }
     .swiper-pagination-bullet { background: var(--muted); opacity:.5; }
@@ -296,12 +792,21 @@ BASE_HTML = """
     if (saved) document.documentElement.setAttribute('data-theme', saved);
   })();
 
-  // init Swiper if present
+  // init Swiper if present. Slides are virtual: Swiper keeps only the ones
+  // around the active slide in the DOM, and further windows are fetched from
+  // the URL in data-next as the user nears the end.
   function initRecipeSwiper(){
     const el = document.querySelector('.recipe-swiper');
-    if(!el) return;
-    new Swiper(el, {
-      slidesPerView: 'auto',
+    if(!el || !el.querySelector('.swiper-slide')) return;
+    const wrapper = el.querySelector('.swiper-wrapper');
+    const slideHtml = (root) => Array.from(root.querySelectorAll('.swiper-slide')).map(s => s.innerHTML);
+    const initial = slideHtml(wrapper);
+    wrapper.innerHTML = '';
+    let nextUrl = el.dataset.next || '';
+    let loading = false;
+
+    const swiper = new Swiper(el, {
+      slidesPerView: 1,
       spaceBetween: 16,
       freeMode: false,
       loop: false,
@@ -309,13 +814,33 @@ BASE_HTML = """
       keyboard: { enabled: true },
       mousewheel: { forceToAxis: true, sensitivity: 0.5 },
       navigation: { nextEl: '.swiper-button-next', prevEl: '.swiper-button-prev' },
-      pagination: { el: '.swiper-pagination', clickable: true },
+      pagination: { el: '.swiper-pagination', clickable: true, dynamicBullets: true },
+      virtual: { slides: initial, addSlidesBefore: 3, addSlidesAfter: 3 },
       breakpoints: {
-        0: { spaceBetween: 12 },
-        576: { spaceBetween: 14 },
-        992: { spaceBetween: 16 }
+        0: { slidesPerView: 1, spaceBetween: 12 },
+        576: { slidesPerView: 2, spaceBetween: 14 },
+        992: { slidesPerView: 3, spaceBetween: 16 }
+      }
+    });
+
+    async function loadMore(){
+      if(!nextUrl || loading) return;
+      loading = true;
+      try {
+        const resp = await fetch(nextUrl, { headers: { 'Accept': 'text/html' } });
+        if(!resp.ok) return;
+        const tpl = document.createElement('template');
+        tpl.innerHTML = await resp.text();
+        nextUrl = resp.headers.get('X-Next-Url') || '';
+        swiper.virtual.appendSlide(slideHtml(tpl.content));
+      } finally {
+        loading = false;
       }
+    }
+    swiper.on('slideChange', () => {
+      if (swiper.activeIndex >= swiper.virtual.slides.length - 6) loadMore();
     });
+    swiper.on('reachEnd', loadMore);
   }
   document.addEventListener('DOMContentLoaded', initRecipeSwiper);
 </script>
@@ -333,67 +858,99 @@ def render(page_title: str, body_html: str):
 
 # ----------------------- Routes -----------------------
 
-@app.route("/")
-def index():
-    q = request.args.get("q", "").strip()
-    sort = request.args.get("sort", "created_at_desc")
-    flt_cuisine = request.args.get("cuisine", "").strip()
-    flt_veg = request.args.get("veg", "")      # '', '1', '0'
-    flt_tried = request.args.get("tried", "")  # '', '1', '0'
-    view_mode = request.args.get("view", "list")  # 'list' or 'carousel'
+CAROUSEL_WINDOW = 12  # slides per server round-trip
+LIST_PAGE_SIZE = 60  # cards per list-view page
 
-    order_by = {
-        "created_at_desc": "created_at DESC",
-        "title": "title COLLATE NOCASE ASC",
-        "cuisine": "cuisine COLLATE NOCASE ASC",
-    }.get(sort, "created_at DESC")
-
-    sql = "SELECT * FROM recipes"
-    params = []
-    wheres = []
-
-    if q:
-        wheres.append("(title LIKE ? OR cuisine LIKE ? OR tags LIKE ? OR mood LIKE ?)")
-        like = f"%{q}%"
-        params.extend([like, like, like, like])
-    if flt_cuisine:
-        wheres.append("cuisine = ?")
-        params.append(flt_cuisine)
-    if flt_veg in ("0", "1"):
-        wheres.append("IFNULL(vegetarian, 0) = ?")
-        params.append(int(flt_veg))
-    if flt_tried in ("0", "1"):
-        wheres.append("IFNULL(tried, 0) = ?")
-        params.append(int(flt_tried))
-
-    if wheres:
-        sql += " WHERE " + " AND ".join(wheres)
-    sql += f" ORDER BY {order_by}"
 
-    with get_db() as db:
-        rows = db.execute(sql, params).fetchall()
-        cuisines = [
-            row[0]
-            for row in db.execute(
-                "SELECT DISTINCT cuisine FROM recipes "
-                "WHERE cuisine IS NOT NULL AND TRIM(cuisine) <> '' "
-                "ORDER BY cuisine COLLATE NOCASE"
-            ).fetchall()
-        ]
+def _encode_cursor(key, recipe_id: int) -> str:
+    return base64.urlsafe_b64encode(json.dumps([key, recipe_id]).encode()).decode().rstrip("=")
 
-    # --- Build cards for BOTH views ---
-    grid_cards = []
-    carousel_slides = []
 
-    for r in rows:
-        safe_title = html.escape(r["title"] or "")
-        safe_cuisine = html.escape(r["cuisine"] or "")
-        safe_mood = html.escape(r["mood"] or "")
-        veg_badge = "<span class='badge badge-pill-soft badge-veg me-1'>Vegetarian</span>" if r["vegetarian"] else ""
-        tried_badge = "<span class='badge badge-pill-soft badge-tried me-1'>Tried</span>" if r["tried"] else ""
-        heat_pct = f"{max(0, min(10, int(r['spice_level']))) * 10}%" if r["spice_level"] is not None else None
-
-        card_inner = f"""
+def _decode_cursor(cursor: str):
+    """(sort_key, id) from a cursor, or None unless it is a string key and an int64 id."""
+    try:
+        key, recipe_id = json.loads(base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4)))
+    except (ValueError, TypeError):
+        return None
+    # every sort key is a TEXT expression; anything else would fail at bind time or in the catalog
+    if not isinstance(key, str) or not isinstance(recipe_id, int) or isinstance(recipe_id, bool):
+        return None
+    if not recipe_query.INT64_MIN <= recipe_id <= recipe_query.INT64_MAX:
+        return None
+    return key, recipe_id
+
+
+# ----------------------- Catalog -----------------------
+_catalogs: "OrderedDict[str, RecipeCatalog]" = OrderedDict()
+_catalogs_lock = threading.Lock()
+
+
+def catalog_for(db, path: Path = None):
+    """Up-to-date catalog for `path` (default: current_db_path()), or None when RECIPE_CATALOG is off.
+
+    Like the connection pool, only the CATALOG_CACHE_SIZE most recently used
+    databases keep a catalog; an evicted one is rebuilt on its next request.
+    """
+    if not RECIPE_CATALOG:
+        return None
+    key = str(path or current_db_path())
+    with _catalogs_lock:
+        catalog = _catalogs.get(key)
+        if catalog is None:
+            catalog = _catalogs[key] = RecipeCatalog()
+            while len(_catalogs) > CATALOG_CACHE_SIZE:
+                _catalogs.popitem(last=False)
+        else:
+            _catalogs.move_to_end(key)
+    catalog.refresh(db)
+    return catalog
+
+
+def fetch_page(db, filters, limit: int, offset: int = 0, after=None, columns: str = "*"):
+    """Rows of one page in display order.
+
+    With the catalog on, filtering and sorting happen in memory and only the
+    page's ids are read from SQLite; otherwise (or for text search and date
+    ranges) the canonical recipe_query statement does the work.
+    """
+    catalog = catalog_for(db)
+    hit = catalog.query(filters, limit, offset, after) if catalog else None
+    if hit is None:
+        sql, params = recipe_query.build(filters, columns=columns, limit=limit, offset=offset, after=after)
+        return db.execute(sql, params).fetchall()
+    ids, _ = hit
+    if not ids:
+        return []
+    sql, params = recipe_query.by_ids(ids, filters["sort"], columns)
+    by_id = {r["id"]: r for r in db.execute(sql, params)}
+    return [by_id[i] for i in ids if i in by_id]
+
+
+if RECIPE_CATALOG:
+    # warm the default database's catalog before gunicorn forks workers
+    _warm = _connect(DB_PATH)
+    catalog_for(_warm, DB_PATH)
+    _warm.close()
+
+
+def _slide_window(db, args, cursor=None):
+    """One window of recipes in display order, plus the cursor for the next window (or None)."""
+    rows = fetch_page(db, recipe_query.parse(args), CAROUSEL_WINDOW + 1, after=cursor)
+    if len(rows) <= CAROUSEL_WINDOW:
+        return rows, None
+    last = rows[CAROUSEL_WINDOW - 1]
+    return rows[:CAROUSEL_WINDOW], _encode_cursor(last["sort_key"], last["id"])
+
+
+def _card_inner(r) -> str:
+    safe_title = html.escape(r["title"] or "")
+    safe_cuisine = html.escape(r["cuisine"] or "")
+    safe_mood = html.escape(r["mood"] or "")
+    veg_badge = "<span class='badge badge-pill-soft badge-veg me-1'>Vegetarian</span>" if r["vegetarian"] else ""
+    tried_badge = "<span class='badge badge-pill-soft badge-tried me-1'>Tried</span>" if r["tried"] else ""
+    heat_pct = f"{max(0, min(10, int(r['spice_level']))) * 10}%" if r["spice_level"] is not None else None
+
+    return f"""
           <div class='card-body'>
             <div class='d-flex justify-content-between align-items-start'>
               <div>
@@ -415,16 +972,64 @@ def index():
           </div>
         """
 
-        grid_cards.append(
-            f"<div class='col'><div class='card shadow-sm h-100'>{card_inner}</div></div>"
-        )
-        carousel_slides.append(
-            f"<div class='swiper-slide'><div class='card shadow-sm'>{card_inner}</div></div>"
-        )
+
+def _carousel_slide(r) -> str:
+    return f"<div class='swiper-slide'><div class='card shadow-sm'>{_card_inner(r)}</div></div>"
+
+
+def _next_slides_url(args, next_cursor) -> str:
+    if not next_cursor:
+        return ""
+    keep = {k: v for k, v in args.to_dict(flat=False).items() if k in recipe_query.FILTER_ARGS}
+    return url_for("slides_fragment", cursor=next_cursor, **keep)
+
+
+@app.route("/")
+def index():
+    filters = recipe_query.parse(request.args)
+    q = filters["q"]
+    sort = filters["sort"]
+    flt_cuisines = filters["cuisines"]
+    flt_veg = filters["veg"]      # '', '1', '0'
+    flt_tried = filters["tried"]  # '', '1', '0'
+    view_mode = request.args.get("view", "list")  # 'list' or 'carousel'
+    # clamped so the OFFSET still binds as an SQLite integer
+    page = min(max(1, request.args.get("page", 1, type=int)), recipe_query.INT64_MAX // LIST_PAGE_SIZE)
+
+    next_cursor = None
+    has_next = False
+    with get_db() as db:
+        # the carousel only renders its first window; the rest streams in from /fragments/slides
+        if view_mode == "carousel":
+            rows, next_cursor = _slide_window(db, request.args)
+        else:
+            rows = fetch_page(db, filters, LIST_PAGE_SIZE + 1, offset=(page - 1) * LIST_PAGE_SIZE)
+            has_next = len(rows) > LIST_PAGE_SIZE
+            rows = rows[:LIST_PAGE_SIZE]
+        cuisines = [
+            row[0]
+            for row in db.execute(
+                "SELECT cuisine FROM stats_cuisine "
+                "WHERE TRIM(cuisine) <> '' "
+                "ORDER BY cuisine COLLATE NOCASE"
+            ).fetchall()
+        ]
+
+    # --- Build cards for the chosen view ---
+    grid_cards = []
+    carousel_slides = []
+
+    for r in rows:
+        if view_mode == "carousel":
+            carousel_slides.append(_carousel_slide(r))
+        else:
+            grid_cards.append(
+                f"<div class='col'><div class='card shadow-sm h-100'>{_card_inner(r)}</div></div>"
+            )
 
     # --- Build filters UI pieces ---
     cuisine_options = "".join(
-        f"<option value='{html.escape(c)}' {'selected' if c == flt_cuisine else ''}>{html.escape(c)}</option>"
+        f"<option value='{html.escape(c)}' {'selected' if c in flt_cuisines else ''}>{html.escape(c)}</option>"
         for c in cuisines
     )
     veg_options = f"""
@@ -438,8 +1043,20 @@ def index():
     <option value='0' {'selected' if flt_tried == '0' else ''}>Not tried</option>
     """
 
+    def range_value(name):
+        return "" if filters[name] is None else html.escape(str(filters[name]))
+
+    # parse() turns the inclusive created_to into an exclusive bound; show the date the user picked
+    created_to = filters["created_before"] - timedelta(days=1) if filters["created_before"] else None
+
+    def page_url(n):
+        keep = request.args.to_dict(flat=False)
+        keep["page"] = n
+        return html.escape(url_for("index", **keep))
+
     # Preserve current params when toggling view
-    params_keep = request.args.to_dict(flat=True)
+    params_keep = request.args.to_dict(flat=False)
+    params_keep.pop("page", None)
     params_keep["view"] = "carousel" if view_mode != "carousel" else "list"
     toggle_label = "Switch to Carousel" if view_mode != "carousel" else "Switch to List"
     toggle_url = url_for("index", **params_keep)
@@ -452,8 +1069,7 @@ def index():
           <input name='q' value='{html.escape(q)}' class='form-control' placeholder='Search by title, cuisine, tags, mood'>
         </div>
         <div class='col-md-3'>
-          <select name='cuisine' class='form-select'>
-            <option value='' {'selected' if not flt_cuisine else ''}>All cuisines</option>
+          <select name='cuisine' class='form-select' multiple size='3' title='All cuisines when none is selected'>
             {cuisine_options}
           </select>
         </div>
@@ -476,6 +1092,12 @@ def index():
             <option value='title' {'selected' if sort == 'title' else ''}>Title</option>
             <option value='cuisine' {'selected' if sort == 'cuisine' else ''}>Cuisine</option>
           </select>
+          <input name='spice_min' type='number' min='1' max='10' value='{range_value("spice_min")}' class='form-control w-auto' placeholder='Heat from'>
+          <input name='spice_max' type='number' min='1' max='10' value='{range_value("spice_max")}' class='form-control w-auto' placeholder='Heat to'>
+          <input name='rating_min' type='number' min='1' max='5' value='{range_value("rating_min")}' class='form-control w-auto' placeholder='Min rating'>
+          <input name='rating_max' type='number' min='1' max='5' value='{range_value("rating_max")}' class='form-control w-auto' placeholder='Max rating'>
+          <input name='created_from' type='date' value='{range_value("created_from")}' class='form-control w-auto' title='Added from'>
+          <input name='created_to' type='date' value='{created_to.isoformat() if created_to else ""}' class='form-control w-auto' title='Added until'>
           <a class='btn btn-outline-dark' href='{url_for('index')}'>Reset</a>
           <a class='btn btn-outline-dark' href='{toggle_url}'>{toggle_label}</a>
         </div>
@@ -493,7 +1115,7 @@ def index():
             <button type="button" class="btn btn-outline-dark btn-sm swiper-button-next">▶</button>
           </div>
         </div>
-        <div class="recipe-swiper swiper">
+        <div class="recipe-swiper swiper" data-next="{html.escape(_next_slides_url(request.args, next_cursor))}">
           <div class="swiper-wrapper">
             {''.join(carousel_slides) or '<p class="text-muted">No recipes yet. Import or add one!</p>'}
           </div>
@@ -501,10 +1123,16 @@ def index():
         </div>
         """
     else:
+        pager = []
+        if page > 1:
+            pager.append(f"<a class='btn btn-outline-dark' href='{page_url(page - 1)}'>← Previous</a>")
+        if has_next:
+            pager.append(f"<a class='btn btn-outline-dark ms-auto' href='{page_url(page + 1)}'>Next →</a>")
         list_html = f"""
         <div class='row row-cols-1 row-cols-md-2 row-cols-lg-3 g-3'>
           {''.join(grid_cards) or '<p>No recipes yet. Import or add one!</p>'}
         </div>
+        {"<div class='d-flex mt-3'>" + "".join(pager) + "</div>" if pager else ""}
         """
 
     body = top_form + list_html
@@ -513,6 +1141,19 @@ def index():
 
 
 
+@app.route("/fragments/slides")
+def slides_fragment():
+    """Next carousel window as slide HTML; X-Next-Url points at the window after it."""
+    cursor = _decode_cursor(request.args.get("cursor", ""))
+    if cursor is None:
+        return "bad cursor", 400
+    with get_db() as db:
+        rows, next_cursor = _slide_window(db, request.args, cursor)
+    resp = app.make_response("".join(_carousel_slide(r) for r in rows))
+    resp.headers["X-Next-Url"] = _next_slides_url(request.args, next_cursor)
+    return resp
+
+
 @app.route("/recipe/<int:recipe_id>")
 def view_recipe(recipe_id: int):
     with get_db() as db:
@@ -588,15 +1229,13 @@ def add_recipe():
         if not data["title"]:
             flash("Title is required")
         else:
-            with get_db() as db:
-                db.execute(
-                    """
-                    INSERT INTO recipes(title,cuisine,mood,ingredients,instructions,spice_level,rating,tags,source,created_at,vegetarian,tried)
-                    VALUES(:title,:cuisine,:mood,:ingredients,:instructions,:spice_level,:rating,:tags,:source,:created_at,:vegetarian,:tried)
-                    """,
-                    data,
-                )
-                db.commit()
+            writer_for().submit(lambda db: db.execute(
+                """
+                INSERT INTO recipes(title,cuisine,mood,ingredients,instructions,spice_level,rating,tags,source,created_at,vegetarian,tried)
+                VALUES(:title,:cuisine,:mood,:ingredients,:instructions,:spice_level,:rating,:tags,:source,:created_at,:vegetarian,:tried)
+                """,
+                data,
+            ))
             flash("Recipe added!")
             return redirect(url_for("index"))
 
@@ -676,25 +1315,23 @@ def edit_recipe(recipe_id: int):
             "tried": 1 if request.form.get("tried") == "on" else 0,
             "id": recipe_id,
         }
-        with get_db() as db:
-            db.execute(
-                """
-                UPDATE recipes
-                   SET title=:title,
-                       cuisine=:cuisine,
-                       mood=:mood,
-                       ingredients=:ingredients,
-                       instructions=:instructions,
-                       spice_level=:spice_level,
-                       rating=:rating,
-                       tags=:tags,
-                       vegetarian=:vegetarian,
-                       tried=:tried
-                 WHERE id=:id
-                """,
-                data,
-            )
-            db.commit()
+        writer_for().submit(lambda db: db.execute(
+            """
+            UPDATE recipes
+               SET title=:title,
+                   cuisine=:cuisine,
+                   mood=:mood,
+                   ingredients=:ingredients,
+                   instructions=:instructions,
+                   spice_level=:spice_level,
+                   rating=:rating,
+                   tags=:tags,
+                   vegetarian=:vegetarian,
+                   tried=:tried
+             WHERE id=:id
+            """,
+            data,
+        ))
         flash("Recipe updated!")
         return redirect(url_for('view_recipe', recipe_id=recipe_id))
 
@@ -755,43 +1392,146 @@ def edit_recipe(recipe_id: int):
     return render("Edit Recipe", body)
 
 
+class ImportTooLarge(Exception):
+    pass
+
+
+def _insert_new(records: List[Dict]):
+    """Writer job inserting `records`, skipping title+cuisine duplicates; returns the number inserted."""
+    def job(db):
+        count = 0
+        for rec in records:
+            title = (rec.get("title") or "").strip()
+            cuisine = (rec.get("cuisine") or "").strip()
+            if not title:
+                continue
+            exists = db.execute(
+                "SELECT id FROM recipes WHERE title = ? AND IFNULL(cuisine,'') = ? LIMIT 1",
+                (title, cuisine)
+            ).fetchone()
+            if exists:
+                continue
+            rec.setdefault("vegetarian", None)
+            rec.setdefault("tried", 0)
+            rec["created_at"] = datetime.now(UTC).isoformat()
+            db.execute(
+                """
+                INSERT INTO recipes(title, cuisine, mood, ingredients, instructions, spice_level, rating, tags,
+                                    source, created_at, vegetarian, tried)
+                VALUES (:title, :cuisine, :mood, :ingredients, :instructions, :spice_level, :rating, :tags, :source,
+                        :created_at, :vegetarian, :tried)
+                """,
+                rec,
+            )
+            count += 1
+        return count
+    return job
+
+
+def import_batches(records: Iterable[Dict], batch_size: int = None) -> Iterator[Dict]:
+    """Insert parsed recipes in fixed-size write batches, yielding running totals after each one."""
+    batch_size = batch_size or IMPORT_BATCH_SIZE
+    records = iter(records)
+    progress = {"batch": 0, "parsed": 0, "imported": 0}
+    while batch := list(itertools.islice(records, batch_size)):
+        progress["batch"] += 1
+        progress["parsed"] += len(batch)
+        progress["imported"] += writer_for().submit(_insert_new(batch))
+        yield dict(progress)
+
+
+def _upload_lines(upload, limit: int) -> Iterator[str]:
+    """Decoded lines of an uploaded file (gzip detected by magic bytes), stopping at `limit` characters."""
+    raw = upload.stream
+    gzipped = raw.read(2) == b"\x1f\x8b"
+    raw.seek(0)
+    text = io.TextIOWrapper(gzip.GzipFile(fileobj=raw) if gzipped else raw, encoding="utf-8", errors="replace")
+    seen = 0
+    try:
+        # bounded readline so one enormous line cannot be pulled into memory whole
+        for line in iter(lambda: text.readline(64 * 1024), ""):
+            seen += len(line)
+            if seen > limit:
+                raise ImportTooLarge(f"Import is larger than {IMPORT_MAX_MB:g} MB.")
+            yield line
+    finally:
+        text.detach()  # closing the wrapper would close upload.stream, which progress still reads
+
+
+def _import_upload(upload):
+    raw = upload.stream
+    progress = import_batches(iter_markdown_collection(_upload_lines(upload, app.config["MAX_CONTENT_LENGTH"])))
+    total = request.content_length
+
+    if request.accept_mimetypes.best_match(["text/html", "application/x-ndjson"]) == "application/x-ndjson":
+        def stream():
+            try:
+                for p in progress:
+                    yield json.dumps({**p, "bytes": raw.tell(), "total_bytes": total}) + "\n"
+            except (ImportTooLarge, EOFError, OSError) as exc:  # gzip errors are OSError/EOFError
+                yield json.dumps({"error": str(exc) or "Unreadable upload."}) + "\n"
+
+        return app.response_class(stream_with_context(stream()), mimetype="application/x-ndjson")
+
+    last = {"batch": 0, "imported": 0}
+    try:
+        for last in progress:
+            pass
+    except (ImportTooLarge, EOFError, OSError) as exc:
+        flash(f"{exc or 'Unreadable upload.'} Stopped after {last['imported']} recipe(s).")
+        return redirect(url_for("import_page"))
+    flash(f"Imported {last['imported']} recipe(s) in {last['batch']} batch(es).")
+    return redirect(url_for("index"))
+
+
+# posts the upload with fetch() and shows the NDJSON progress lines as they arrive
+IMPORT_PROGRESS_JS = """
+<script>
+  document.getElementById('upload-form').addEventListener('submit', async (e) => {
+    if (!window.TextDecoderStream) return;  // plain form post instead
+    e.preventDefault();
+    const out = document.getElementById('upload-progress');
+    out.textContent = 'Uploading…';
+    const resp = await fetch(e.target.action, {method: 'POST', body: new FormData(e.target),
+                                               headers: {Accept: 'application/x-ndjson'}});
+    if (resp.redirected) { location.href = resp.url; return; }  // rejected, e.g. too large
+    if (!resp.ok) { out.textContent = `Upload failed (${resp.status}).`; return; }
+    const reader = resp.body.pipeThrough(new TextDecoderStream()).getReader();
+    let buf = '', last = null;
+    for (;;) {
+      const {value, done} = await reader.read();
+      if (done) break;
+      const lines = (buf + value).split('\\n');
+      buf = lines.pop();
+      for (const line of lines.filter(Boolean)) {
+        last = JSON.parse(line);
+        out.textContent = last.error
+          ? last.error
+          : `Batch ${last.batch}: ${last.imported} imported of ${last.parsed} parsed`
+            + (last.total_bytes ? ` (${Math.round(100 * last.bytes / last.total_bytes)}% read)` : '');
+      }
+    }
+    if (last && !last.error) out.textContent += ' — done.';
+  });
+</script>
+"""
+
+
 @app.route("/import", methods=["GET", "POST"])
 def import_page():
     if request.method == "POST":
+        upload = request.files.get("md_file")
+        if upload and upload.filename:
+            return _import_upload(upload)
+
         md_text = request.form.get("md_text", "").strip()
         if not md_text:
             flash("Paste your markdown or text to import.")
             return redirect(url_for("import_page"))
 
-        imported = parse_markdown_collection(md_text)
         count = 0
-        with get_db() as db:
-            for rec in imported:
-                title = (rec.get("title") or "").strip()
-                cuisine = (rec.get("cuisine") or "").strip()
-                if not title:
-                    continue
-                exists = db.execute(
-                    "SELECT id FROM recipes WHERE title = ? AND IFNULL(cuisine,'') = ? LIMIT 1",
-                    (title, cuisine)
-                ).fetchone()
-                if exists:
-                    continue
-                rec.setdefault("vegetarian", None)
-                rec.setdefault("tried", 0)
-                rec["created_at"] = datetime.now(UTC).isoformat()
-                db.execute(
-                    """
-                    INSERT INTO recipes(title, cuisine, mood, ingredients, instructions, spice_level, rating, tags,
-                                        source, created_at, vegetarian, tried)
-                    VALUES (:title, :cuisine, :mood, :ingredients, :instructions, :spice_level, :rating, :tags, :source,
-                            :created_at, :vegetarian, :tried)
-                    """,
-                    rec,
-                )
-                count += 1
-            db.commit()
-
+        for progress in import_batches(parse_markdown_collection(md_text)):
+            count = progress["imported"]
         flash(f"Imported {count} recipe(s).")
         return redirect(url_for("index"))
 
@@ -806,6 +1546,15 @@ def import_page():
     body = f"""
       <div class='row'>
         <div class='col-lg-10'>
+          <form method='post' enctype='multipart/form-data' id='upload-form' action='{url_for("import_page")}'
+                class='shadow-sm p-3 rounded-4 bg-white mb-4'>
+            <label class='form-label'>Upload a file</label>
+            <input type='file' name='md_file' class='form-control'
+                   accept='.md,.markdown,.txt,.gz,text/markdown,text/plain,application/gzip'>
+            <div class='form-text'>Markdown or text, optionally gzipped, up to {IMPORT_MAX_MB:g} MB.</div>
+            <button class='btn btn-success mt-3'>Upload &amp; import</button>
+            <div id='upload-progress' class='form-text mt-2'></div>
+          </form>
           <form method='post'>
             <label class='form-label'>Paste Markdown/Text</label>
             <textarea name='md_text' rows='18' class='form-control' placeholder='{placeholder}'></textarea>
@@ -815,19 +1564,15 @@ def import_page():
         </div>
       </div>
     """
-    return render("Import", body)
+    return render("Import", body + IMPORT_PROGRESS_JS)
 
 
 @app.route("/delete/<int:recipe_id>", methods=["POST"])
 def delete_recipe(recipe_id: int):
-    # make sure it exists (optional but nicer UX)
-    with get_db() as db:
-        row = db.execute("SELECT id, title FROM recipes WHERE id = ?", (recipe_id,)).fetchone()
-        if not row:
-            flash("Recipe not found (maybe you already deleted it).")
-            return redirect(url_for("index"))
-        db.execute("DELETE FROM recipes WHERE id = ?", (recipe_id,))
-        db.commit()
+    deleted = writer_for().submit(lambda db: db.execute("DELETE FROM recipes WHERE id = ?", (recipe_id,)).rowcount)
+    if not deleted:
+        flash("Recipe not found (maybe you already deleted it).")
+        return redirect(url_for("index"))
     flash("Recipe deleted.")
     return redirect(url_for("index"))
 
@@ -838,58 +1583,722 @@ from flask import jsonify
 def not_found(_):
     return render("Not Found", "<div class='text-center py-5'><h3>Not found.</h3><p>Try the search box.</p></div>"), 404
 
+@app.errorhandler(413)
+def too_large(_):
+    if request.mimetype == "multipart/form-data":
+        flash(f"That upload is larger than {IMPORT_MAX_MB:g} MB.")
+    else:  # pasted text hits the form-field limit long before IMPORT_MAX_MB
+        flash(f"That import is too large to paste; upload it as a file (up to {IMPORT_MAX_MB:g} MB).")
+    return redirect(url_for("import_page"))
+
 @app.route("/healthz")
 def healthz():
-    return jsonify(ok=True), 200
+    return jsonify(ok=True, writer=writer_for().stats()), 200
+
+@app.route("/api/stats")
+def api_stats():
+    with get_db() as db:
+        cuisines = db.execute(
+            "SELECT cuisine, recipes, rating_sum, rated, tried FROM stats_cuisine ORDER BY recipes DESC, cuisine"
+        ).fetchall()
+        spice = db.execute("SELECT spice_level, recipes FROM stats_spice ORDER BY spice_level").fetchall()
+    total = sum(r["recipes"] for r in cuisines)
+    tried = sum(r["tried"] for r in cuisines)
+    unset = total - sum(r["recipes"] for r in spice)
+    return jsonify(
+        total=total,
+        tried=tried,
+        untried=total - tried,
+        tried_ratio=round(tried / total, 4) if total else None,
+        cuisines=[
+            {
+                "cuisine": r["cuisine"] or None,
+                "recipes": r["recipes"],
+                "tried": r["tried"],
+                "avg_rating": round(r["rating_sum"] / r["rated"], 2) if r["rated"] else None,
+            }
+            for r in cuisines
+        ],
+        spice_levels=([{"spice_level": None, "recipes": unset}] if unset else [])
+        + [{"spice_level": r["spice_level"], "recipes": r["recipes"]} for r in spice],
+    )
+
+
+@app.route("/api/recipes/changes")
+def api_recipe_changes():
+    """Upserts and tombstones after `since`, oldest first, for incremental mirrors."""
+    since = request.args.get("since", 0, type=int)
+    if not recipe_query.INT64_MIN <= since <= recipe_query.INT64_MAX:
+        return jsonify(error="since is out of range"), 400
+    limit = max(1, min(request.args.get("limit", 500, type=int), 5000))
+    cols = ", ".join(f"r.{c}" for c in API_COLUMNS.split(","))
+    with get_db() as db:
+        horizon = db.execute("SELECT compacted_through FROM change_log_state").fetchone()[0]
+        # since=0 is a full snapshot (every live recipe keeps an upsert), so it is always served
+        if 0 < since < horizon:
+            return jsonify(error="since is older than the compacted change log; resync with since=0",
+                           compacted_through=horizon), 410
+        rows = db.execute(
+            f"""
+            SELECT c.seq, c.recipe_id, c.op, {cols}
+              FROM recipe_changes c LEFT JOIN recipes r ON r.id = c.recipe_id
+             WHERE c.seq > ? ORDER BY c.seq LIMIT ?
+            """,
+            (since, limit + 1),
+        ).fetchall()
+    has_more = len(rows) > limit
+    changes = []
+    for row in rows[:limit]:
+        if row["op"] == "delete":
+            changes.append({"seq": row["seq"], "op": "delete", "id": row["recipe_id"]})
+        else:
+            recipe = {k: row[k] for k in API_COLUMNS.split(",")}
+            changes.append({"seq": row["seq"], "op": "upsert", "recipe": recipe})
+    next_since = changes[-1]["seq"] if changes else since
+    return jsonify(changes=changes, next_since=next_since, has_more=has_more)
+
 
 @app.route("/api/recipes")
 def api_recipes():
-    q = request.args.get("q", "").strip()
-    flt_cuisine = request.args.get("cuisine", "").strip()
-    flt_veg = request.args.get("veg", "")
-    flt_tried = request.args.get("tried", "")
-
-    sql = "SELECT id,title,cuisine,mood,spice_level,rating,tags,vegetarian,tried,created_at FROM recipes"
-    params, wheres = [], []
-    if q:
-        wheres.append("(title LIKE ? OR cuisine LIKE ? OR tags LIKE ? OR mood LIKE ?)")
-        like = f"%{q}%"; params.extend([like, like, like, like])
-    if flt_cuisine:
-        wheres.append("cuisine = ?"); params.append(flt_cuisine)
-    if flt_veg in ("0","1"):
-        wheres.append("IFNULL(vegetarian,0) = ?"); params.append(int(flt_veg))
-    if flt_tried in ("0","1"):
-        wheres.append("IFNULL(tried,0) = ?"); params.append(int(flt_tried))
-    if wheres: sql += " WHERE " + " AND ".join(wheres)
-    sql += " ORDER BY created_at DESC LIMIT 200"
-
+    filters = recipe_query.parse(request.args)
     with get_db() as db:
-        rows = [dict(r) for r in db.execute(sql, params).fetchall()]
+        rows = [{k: r[k] for k in API_COLUMNS.split(",")} for r in fetch_page(db, filters, 200, columns=API_COLUMNS)]
     return jsonify(rows)
 
 
-def clean_existing_instructions():
-    """One-time DB maintenance: strip leading numbering/bullets from all instructions."""
+# ----------------------- Profiling -----------------------
+# An admin adds ?__profile=1 (or PROFILE_SAMPLE_RATE picks the request) and the
+# request runs under cProfile. Each profile is saved as <name>.prof, loadable
+# with pstats/snakeviz, plus <name>.json holding the summary shown on
+# /admin/profiles; only the newest PROFILE_KEEP are kept.
+PROFILE_NAME_RE = re.compile(r"^\d{8}T\d{9}-\d+-\d+-[\w.]+$")
+_profile_lock = threading.Lock()  # one profiled request at a time per worker
+_profile_seq = 0
+
+
+def _is_sql(key) -> bool:
+    return key[0] == "~" and "sqlite3." in key[2]
+
+
+def _is_future_wait(key) -> bool:
+    # Future.result(); compare path parts so Windows separators match too
+    return key[2] == "result" and Path(key[0]).parts[-3:] == ("concurrent", "futures", "_base.py")
+
+
+# bucket -> predicate on a pstats key (file, line, function); cumulative times are summed
+PROFILE_BUCKETS = {
+    "sql": _is_sql,
+    "cards": lambda key: key[0] == __file__ and key[2] == "_card_inner",  # _carousel_slide wraps it
+    "jinja": lambda key: key[0] == __file__ and key[2] == "render",
+    "parser": lambda key: key[0] == __file__ and key[2] == "parse_markdown_collection",
+    "writer_wait": _is_future_wait,
+}
+
+
+def is_admin() -> bool:
+    """True when the request's X-Admin-Token header matches ADMIN_TOKEN.
+
+    Checked on every request and never stored in the session or read from the
+    URL: the session cookie is only as secret as FLASK_SECRET, URLs end up in
+    logs and saved profiles, and a custom header cannot be sent cross-site.
+    """
+    token = request.headers.get("X-Admin-Token", "")
+    return bool(ADMIN_TOKEN) and hmac.compare_digest(token.encode(), ADMIN_TOKEN.encode())
+
+
+def profile_summary(stats: pstats.Stats, top: int = 15) -> Dict:
+    """Per-bucket cumulative ms and the functions with the most own time."""
+    buckets = dict.fromkeys(PROFILE_BUCKETS, 0.0)
+    for key, (_, _, _, cumulative, _) in stats.stats.items():
+        for name, match in PROFILE_BUCKETS.items():
+            if match(key):
+                buckets[name] += cumulative
+    hottest = sorted(stats.stats.items(), key=lambda item: item[1][2], reverse=True)[:top]
+    return {
+        "total_ms": round(stats.total_tt * 1000, 2),
+        "buckets": {name: round(sec * 1000, 2) for name, sec in buckets.items()},
+        "top": [
+            {"function": pstats.func_std_string(key), "calls": nc,
+             "own_ms": round(tt * 1000, 3), "cumulative_ms": round(ct * 1000, 3)}
+            for key, (_, nc, tt, ct, _) in hottest
+        ],
+    }
+
+
+def _rotate_profiles():
+    names = sorted(p.stem for p in PROFILE_DIR.glob("*.prof"))
+    for name in names[:max(0, len(names) - PROFILE_KEEP)]:
+        for suffix in (".prof", ".json"):
+            (PROFILE_DIR / f"{name}{suffix}").unlink(missing_ok=True)
+
+
+def list_profiles() -> List[Dict]:
+    """Saved profile summaries, newest first."""
+    out = []
+    for meta in sorted(PROFILE_DIR.glob("*.json"), reverse=True):
+        try:
+            out.append(json.loads(meta.read_text()))
+        except (OSError, ValueError):
+            continue  # rotated away or half-written
+    return out
+
+
+@app.before_request
+def _start_profile():
+    if request.path.startswith("/admin/profiles"):
+        return
+    wanted = request.args.get("__profile") == "1" and is_admin()
+    if not (wanted or (PROFILE_SAMPLE_RATE and random.random() < PROFILE_SAMPLE_RATE)):
+        return
+    if not _profile_lock.acquire(blocking=False):
+        return
+    profiler = cProfile.Profile()
+    try:
+        profiler.enable()
+    except ValueError:  # another profiler (debugger, coverage) owns the hook
+        _profile_lock.release()
+        return
+    g.profiler = profiler
+
+
+@app.after_request
+def _save_profile(response):
+    profiler = g.pop("profiler", None)
+    if profiler is None:
+        return response
+    global _profile_seq
+    try:
+        profiler.disable()
+        _profile_seq += 1
+        stamp = f"{datetime.now(UTC):%Y%m%dT%H%M%S%f}"[:-3]  # sorts oldest first for rotation
+        name = f"{stamp}-{os.getpid()}-{_profile_seq}-{request.endpoint or 'unknown'}"
+        PROFILE_DIR.mkdir(parents=True, exist_ok=True)
+        profiler.dump_stats(PROFILE_DIR / f"{name}.prof")
+        summary = profile_summary(pstats.Stats(profiler))
+        meta = {"name": name, "method": request.method, "path": request.full_path.rstrip("?"),
+                "status": response.status_code, **summary}
+        (PROFILE_DIR / f"{name}.json").write_text(json.dumps(meta))
+        _rotate_profiles()
+        response.headers["X-Profile"] = name
+    finally:
+        _profile_lock.release()
+    return response
+
+
+@app.teardown_request
+def _drop_profile(_exc):
+    # after_request is skipped when the response itself fails; never leak the lock
+    profiler = g.pop("profiler", None)
+    if profiler is not None:
+        profiler.disable()
+        _profile_lock.release()
+
+
+@app.route("/admin/profiles")
+def admin_profiles():
+    if not is_admin():
+        abort(403)
+    cards = []
+    for p in list_profiles():
+        buckets = " · ".join(f"{k} {v:.1f} ms" for k, v in p["buckets"].items())
+        rows = "".join(
+            f"<tr><td class='text-end'>{t['own_ms']:.2f}</td><td class='text-end'>{t['cumulative_ms']:.2f}</td>"
+            f"<td class='text-end'>{t['calls']}</td><td><code>{html.escape(t['function'])}</code></td></tr>"
+            for t in p["top"]
+        )
+        cards.append(f"""
+        <div class='card shadow-sm mb-3'><div class='card-body'>
+          <div class='d-flex justify-content-between'>
+            <h6 class='mb-1'>{html.escape(p['method'])} {html.escape(p['path'])} → {p['status']}</h6>
+            <a class='btn btn-sm btn-outline-dark' href='{url_for("admin_profile_file", name=p["name"])}'>.prof</a>
+          </div>
+          <div class='text-muted small mb-2'>{html.escape(p['name'])} · total {p['total_ms']:.1f} ms · {buckets}</div>
+          <table class='table table-sm small mb-0'>
+            <thead><tr><th class='text-end'>own ms</th><th class='text-end'>cum ms</th><th class='text-end'>calls</th><th>function</th></tr></thead>
+            <tbody>{rows}</tbody>
+          </table>
+        </div></div>
+        """)
+    body = "<h4 class='mb-3'>Request profiles</h4>" + (
+        "".join(cards) or "<p class='text-muted'>No profiles yet. Add <code>?__profile=1</code> to a page.</p>"
+    )
+    return render("Profiles", body)
+
+
+@app.route("/admin/profiles/<name>.prof")
+def admin_profile_file(name: str):
+    if not is_admin() or not PROFILE_NAME_RE.match(name):
+        abort(403)
+    return send_from_directory(PROFILE_DIR, f"{name}.prof", as_attachment=True)
+
+
+# ----------------------- Maintenance -----------------------
+# Tasks walk the table in bounded id ranges and commit each batch together with
+# its checkpoint, so a big table never sits in memory and the write lock is only
+# held for one batch at a time.  Run them with `flask maintenance run <task>`.
+MAINTENANCE_TASKS: Dict[str, Dict] = {}
+STEP_PREFIX_RE = re.compile(r'^\s*(?:\d+[.)]\s*|[-•]\s*)')
+
+
+def _max_recipe_id(db) -> int:
+    return db.execute("SELECT IFNULL(MAX(id), 0) FROM recipes").fetchone()[0]
+
+
+def maintenance_task(name: str, extent=_max_recipe_id, batch_size: int = 500):
+    """Register a chunked maintenance task.
+
+    The task is called as fn(db, lo, hi, dry_run) for successive position ranges
+    (lo, hi] up to extent(db) and returns how many items it changed. For row
+    tasks a position is a recipe id.
+    """
+    def register(fn):
+        MAINTENANCE_TASKS[name] = {
+            "fn": fn,
+            "extent": extent,
+            "batch_size": batch_size,
+            "help": (fn.__doc__ or "").strip().splitlines()[0] if fn.__doc__ else "",
+        }
+        return fn
+    return register
+
+
+def run_maintenance(name: str, batch_size: int = None, dry_run: bool = False,
+                    restart: bool = False, progress=None) -> int:
+    """Run a registered task batch by batch and return the number of changed items.
+
+    Each batch is committed with the task's checkpoint, so an interrupted run
+    resumes after its last committed batch unless restart is set. Dry runs roll
+    every batch back and leave the checkpoint untouched.
+    """
+    task = MAINTENANCE_TASKS[name]
+    batch_size = batch_size or task["batch_size"]
+    changed = 0
     with get_db() as db:
-        rows = db.execute(
-            "SELECT id, instructions FROM recipes WHERE instructions IS NOT NULL"
-        ).fetchall()
-        changed = 0
-        for row in rows:
-            original = row["instructions"] or ""
-            lines = original.splitlines()
-            cleaned_lines = []
-            for line in lines:
-                line = re.sub(r'^\s*(?:\d+[.)]\s*|[-•]\s*)', '', line).strip()
-                if line:
-                    cleaned_lines.append(line)
-            cleaned = "\n".join(cleaned_lines)
-            if cleaned != original:
+        row = db.execute(
+            "SELECT position FROM maintenance_checkpoints WHERE task = ?", (name,)
+        ).fetchone()
+        lo = row["position"] if row and not restart else 0
+        end = task["extent"](db)
+        while lo < end:
+            hi = min(lo + batch_size, end)
+            changed += task["fn"](db, lo, hi, dry_run)
+            if dry_run:
+                db.rollback()
+            else:
+                db.execute(
+                    """
+                    INSERT INTO maintenance_checkpoints(task, position, updated_at) VALUES (?, ?, ?)
+                    ON CONFLICT(task) DO UPDATE SET position = excluded.position, updated_at = excluded.updated_at
+                    """,
+                    (name, hi, datetime.now(UTC).isoformat()),
+                )
+                db.commit()
+            if progress:
+                progress(hi, end)
+            lo = hi
+        if not dry_run:
+            db.execute("DELETE FROM maintenance_checkpoints WHERE task = ?", (name,))
+            db.commit()
+    return changed
+
+
+@maintenance_task("clean-instructions")
+def clean_instructions_task(db, lo: int, hi: int, dry_run: bool) -> int:
+    """Strip leading numbering/bullets from stored instruction steps."""
+    rows = db.execute(
+        "SELECT id, instructions FROM recipes WHERE id > ? AND id <= ? AND instructions IS NOT NULL",
+        (lo, hi),
+    ).fetchall()
+    changed = 0
+    for row in rows:
+        original = row["instructions"] or ""
+        cleaned_lines = []
+        for line in original.splitlines():
+            line = STEP_PREFIX_RE.sub('', line).strip()
+            if line:
+                cleaned_lines.append(line)
+        cleaned = "\n".join(cleaned_lines)
+        if cleaned != original:
+            if not dry_run:
                 db.execute("UPDATE recipes SET instructions = ? WHERE id = ?", (cleaned, row["id"]))
-                changed += 1
-        db.commit()
+            changed += 1
+    return changed
+
+
+def _recipe_indexes(db) -> List[str]:
+    return sorted(row["name"] for row in db.execute("PRAGMA index_list(recipes)"))
+
+
+@maintenance_task("reindex", extent=lambda db: len(_recipe_indexes(db)) + 1, batch_size=1)
+def reindex_task(db, lo: int, hi: int, dry_run: bool) -> int:
+    """Rebuild the recipes indexes one at a time, then refresh planner statistics."""
+    names = _recipe_indexes(db)
+    steps = [f'REINDEX "{n}"' for n in names[lo:hi]]
+    if hi > len(names):
+        steps.append("ANALYZE recipes")
+    if not dry_run:
+        for stmt in steps:
+            db.execute(stmt)
+    return len(steps)
+
+
+def _max_change_seq(db) -> int:
+    return db.execute("SELECT IFNULL(MAX(seq), 0) FROM recipe_changes").fetchone()[0]
+
+
+@maintenance_task("compact-changes", extent=_max_change_seq, batch_size=5000)
+def compact_changes_task(db, lo: int, hi: int, dry_run: bool) -> int:
+    """Drop change-log tombstones older than CHANGE_RETENTION_DAYS."""
+    cutoff = datetime.now(UTC) - timedelta(days=CHANGE_RETENTION_DAYS)
+    cutoff = cutoff.isoformat(timespec="milliseconds").replace("+00:00", "Z")  # trigger timestamp format
+    expired = db.execute(
+        "SELECT COUNT(*), MAX(seq) FROM recipe_changes WHERE seq > ? AND seq <= ? AND op = 'delete' AND changed_at < ?",
+        (lo, hi, cutoff),
+    ).fetchone()
+    if expired[0] and not dry_run:
+        db.execute(
+            "DELETE FROM recipe_changes WHERE seq > ? AND seq <= ? AND op = 'delete' AND changed_at < ?",
+            (lo, hi, cutoff),
+        )
+        db.execute(
+            "UPDATE change_log_state SET compacted_through = MAX(compacted_through, ?)", (expired[1],)
+        )
+    return expired[0]
+
+
+def clean_existing_instructions():
+    """One-time DB maintenance: strip leading numbering/bullets from all instructions."""
+    changed = run_maintenance("clean-instructions")
     print(f"Cleaned {changed} recipe(s).")
 
 
+# ----------------------- Snapshots -----------------------
+# Online copies through SQLite's backup API. Each step copies SNAPSHOT_PAGES
+# pages under a brief read lock, then sleeps so writers get the lock in between;
+# the file only appears under its final name once complete. Restores verify the
+# snapshot first and copy it back through SQLite too, so open connections in
+# every worker see the restored data instead of a swapped-out inode. Each
+# database has its own directory (and rotation quota) under SNAPSHOT_DIR.
+SNAPSHOT_NAME_RE = re.compile(r"^[\w.-]+-\d{8}T\d{9}\.db$")
+SNAPSHOT_MAX_RESTARTS = 3  # paced attempts overtaken by other writers before copying in one step
+
+
+class SnapshotError(Exception):
+    pass
+
+
+class _BackupRestarted(Exception):
+    pass
+
+
+def _copy_paced(src, dst, pages: int, sleep: float) -> int:
+    """Backup src into dst step by step; returns how often other connections' writes forced a restart."""
+    restarts = 0
+    remaining_before = None
+
+    def progress(_status, remaining, _total):
+        nonlocal restarts, remaining_before
+        if remaining_before is not None and remaining > remaining_before:
+            restarts += 1  # another connection wrote; SQLite started over
+            if restarts > SNAPSHOT_MAX_RESTARTS:
+                raise _BackupRestarted
+        remaining_before = remaining
+        if remaining:
+            time.sleep(sleep)  # backup()'s own sleep only applies when a step finds the file locked
+
+    # in WAL mode one pinned read transaction gives every step the same snapshot,
+    # so writers carry on and the copy never restarts
+    pinned = src.execute("PRAGMA journal_mode").fetchone()[0] == "wal"
+    if pinned:
+        src.execute("BEGIN")
+        src.execute("SELECT 1 FROM sqlite_master LIMIT 1").fetchall()
+    try:
+        src.backup(dst, pages=pages, progress=progress)
+    except _BackupRestarted:
+        # a steady stream of writes keeps overtaking the paced copy; finish under one read lock
+        src.backup(dst)
+    finally:
+        if pinned:
+            src.rollback()
+    return restarts
+
+
+def snapshot_dir(path: Path = None) -> Path:
+    """SNAPSHOT_DIR/default for DB_PATH, SNAPSHOT_DIR/tenants/<name> for a tenant's file."""
+    path = Path(path or DB_PATH)
+    if path == DB_PATH:
+        return SNAPSHOT_DIR / "default"
+    if path.parent == TENANT_DIR and TENANT_RE.match(path.stem):
+        return SNAPSHOT_DIR / "tenants" / path.stem
+    raise SnapshotError(f"{path} is neither the main database nor a tenant database.")
+
+
+def list_snapshots(path: Path = None) -> List[Dict]:
+    """Snapshots of `path` (default DB_PATH), newest first."""
+    out = []
+    for f in sorted(snapshot_dir(path).glob("*.db"), reverse=True):
+        if SNAPSHOT_NAME_RE.match(f.name):
+            stat = f.stat()
+            out.append({"name": f.name, "bytes": stat.st_size,
+                        "created_at": datetime.fromtimestamp(stat.st_mtime, UTC).isoformat(timespec="seconds")})
+    return out
+
+
+def rotate_snapshots(path: Path = None):
+    """Delete all but the newest SNAPSHOT_KEEP snapshots of `path`."""
+    for old in list_snapshots(path)[SNAPSHOT_KEEP:]:
+        (snapshot_dir(path) / old["name"]).unlink(missing_ok=True)
+
+
+def create_snapshot(path: Path = None, pages: int = None, sleep_ms: float = None, rotate: bool = True) -> Dict:
+    """Copy the live database (default DB_PATH) into its snapshot_dir(), then rotate old snapshots."""
+    path = path or DB_PATH
+    pages = pages or SNAPSHOT_PAGES
+    sleep = (SNAPSHOT_SLEEP_MS if sleep_ms is None else sleep_ms) / 1000
+    folder = snapshot_dir(path)
+    folder.mkdir(parents=True, exist_ok=True)
+    stamp = f"{datetime.now(UTC):%Y%m%dT%H%M%S%f}"[:-3]
+    final = folder / f"{path.stem}-{stamp}.db"
+    part = final.with_name(final.name + ".part")
+    started = time.perf_counter()
+    src, dst = _connect(path), sqlite3.connect(part)
+    try:
+        restarts = _copy_paced(src, dst, pages, sleep)
+        dst.execute("PRAGMA journal_mode = DELETE")  # a self-contained file, no -wal/-shm needed
+    except Exception:
+        dst.close()
+        part.unlink(missing_ok=True)
+        raise
+    finally:
+        src.close()
+    dst.close()
+    part.replace(final)
+    if rotate:
+        rotate_snapshots(path)
+    return {"name": final.name, "bytes": final.stat().st_size, "restarts": restarts,
+            "ms": round((time.perf_counter() - started) * 1000, 1)}
+
+
+def verify_snapshot(name: str, path: Path = None) -> Path:
+    """Path of `path`'s snapshot `name` after PRAGMA integrity_check passes; SnapshotError otherwise."""
+    snap = snapshot_dir(path) / name
+    if not SNAPSHOT_NAME_RE.match(name) or not snap.is_file():
+        raise SnapshotError(f"No snapshot named {name!r}.")
+    db = sqlite3.connect(f"file:{snap}?mode=ro", uri=True)
+    try:
+        problems = [r[0] for r in db.execute("PRAGMA integrity_check")]
+    except sqlite3.DatabaseError as exc:
+        problems = [str(exc)]
+    finally:
+        db.close()
+    if problems != ["ok"]:
+        raise SnapshotError(f"{name} failed integrity_check: {'; '.join(problems[:5])}")
+    return snap
+
+
+def restore_snapshot(name: str, path: Path = None) -> Dict:
+    """Verify snapshot `name`, snapshot the current state, then copy it over the live database."""
+    path = path or DB_PATH
+    snap = verify_snapshot(name, path)
+    # the state being replaced stays restorable; rotating now could delete `snap`
+    safety = create_snapshot(path, rotate=False)
+    # stage a copy: an older snapshot may predate recent migrations, and its
+    # counters must be moved past the live ones before anyone can see it
+    staging = snap.with_name(snap.name + ".restore")
+    src, stage = sqlite3.connect(f"file:{snap}?mode=ro", uri=True), sqlite3.connect(staging)
+    try:
+        src.backup(stage)
+    finally:
+        src.close()
+        stage.close()
+    try:
+        init_db(staging)
+        stage, dst = _connect(staging), _connect(path)
+        try:
+            dst.execute("PRAGMA busy_timeout = 30000")
+            live = dict(dst.execute("SELECT name, seq FROM sqlite_sequence WHERE name IN ('recipes', 'recipe_changes')"))
+            _advance_counters(stage, live)
+            stage.backup(dst)  # one step: readers never see a half-restored file
+        finally:
+            stage.close()
+            dst.close()
+    finally:
+        staging.unlink(missing_ok=True)
+    init_db(path)
+    rotate_snapshots(path)
+    return {"restored": name, "previous": safety["name"]}
+
+
+def _advance_counters(db, live: Dict[str, int]):
+    """Keep a restored database from reusing ids and change seqs that clients have already seen.
+
+    Recipe ids continue after the live ones. The restored change log is moved
+    above every live seq and everything below it is marked compacted, so feed
+    clients get 410 and resync and in-memory catalogs reload.
+    """
+    if not db.execute("UPDATE sqlite_sequence SET seq = MAX(seq, ?) WHERE name = 'recipes'",
+                      (live.get("recipes", 0),)).rowcount:
+        db.execute("INSERT INTO sqlite_sequence(name, seq) VALUES ('recipes', ?)", (live.get("recipes", 0),))
+    restored = db.execute("SELECT IFNULL(MAX(seq), 0) FROM recipe_changes").fetchone()[0]
+    horizon = max(live.get("recipe_changes", 0), restored) + 1
+    db.execute("UPDATE recipe_changes SET seq = seq + ?", (horizon,))
+    db.execute("DELETE FROM sqlite_sequence WHERE name = 'recipe_changes'")
+    db.execute("INSERT INTO sqlite_sequence(name, seq) VALUES ('recipe_changes', ?)", (horizon + restored,))
+    db.execute("UPDATE change_log_state SET compacted_through = ?", (horizon,))
+    db.commit()
+
+
+@app.route("/admin/snapshots", methods=["GET", "POST"])
+def admin_snapshots():
+    if not is_admin():
+        abort(403)
+    if request.method == "POST":
+        snap = create_snapshot(current_db_path())
+        flash(f"Snapshot {snap['name']} written ({snap['bytes'] // 1024} KiB in {snap['ms']:.0f} ms).")
+        return redirect(url_for("admin_snapshots"))
+    rows = "".join(
+        f"""<tr><td><code>{html.escape(s['name'])}</code></td><td class='text-end'>{s['bytes'] // 1024} KiB</td>
+        <td>{s['created_at']}</td><td class='text-end'>
+          <form method='post' action='{url_for("admin_restore_snapshot", name=s["name"])}'
+                onsubmit="return confirm('Replace the live database with {html.escape(s['name'])}?');">
+            <button class='btn btn-sm btn-outline-danger'>Restore</button>
+          </form></td></tr>"""
+        for s in list_snapshots(current_db_path())
+    )
+    body = f"""
+    <div class='d-flex justify-content-between align-items-center mb-3'>
+      <h4 class='m-0'>Snapshots</h4>
+      <form method='post'><button class='btn btn-success'>Take snapshot</button></form>
+    </div>
+    <table class='table table-sm bg-white'>
+      <thead><tr><th>name</th><th class='text-end'>size</th><th>taken</th><th></th></tr></thead>
+      <tbody>{rows or "<tr><td colspan='4' class='text-muted'>No snapshots yet.</td></tr>"}</tbody>
+    </table>
+    """
+    return render("Snapshots", body)
+
+
+@app.route("/admin/snapshots/<name>/restore", methods=["POST"])
+def admin_restore_snapshot(name: str):
+    if not is_admin():
+        abort(403)
+    try:
+        result = restore_snapshot(name, current_db_path())
+    except SnapshotError as exc:
+        flash(str(exc))
+    else:
+        flash(f"Restored {result['restored']}; the replaced data is in {result['previous']}.")
+    return redirect(url_for("admin_snapshots"))
+
+
+@app.cli.group()
+def maintenance():
+    """Chunked, resumable database maintenance tasks."""
+
+
+@maintenance.command("list")
+def maintenance_list():
+    """Show the registered maintenance tasks."""
+    for name in sorted(MAINTENANCE_TASKS):
+        click.echo(f"{name:<22}{MAINTENANCE_TASKS[name]['help']}")
+
+
+@maintenance.command("run")
+@click.argument("name", type=click.Choice(sorted(MAINTENANCE_TASKS)))
+@click.option("--batch-size", type=click.IntRange(min=1), default=None,
+              help="Positions per committed batch (default depends on the task).")
+@click.option("--dry-run", is_flag=True, help="Report what would change without writing anything.")
+@click.option("--restart", is_flag=True, help="Ignore a saved checkpoint and start from the beginning.")
+def maintenance_run(name, batch_size, dry_run, restart):
+    """Run maintenance task NAME, resuming from its checkpoint if one exists."""
+    def show(position, end):
+        click.echo(f"\r{name}: {position}/{end} ({position * 100 // max(end, 1)}%)", nl=False)
+
+    changed = run_maintenance(name, batch_size=batch_size, dry_run=dry_run, restart=restart, progress=show)
+    click.echo()
+    click.echo(f"{'Would change' if dry_run else 'Changed'} {changed} item(s).")
+
+
+@app.cli.group("stats")
+def stats_cli():
+    """Summary tables behind /api/stats."""
+
+
+@stats_cli.command("verify")
+@click.option("--repair", is_flag=True, help="Rebuild the summaries if they have drifted.")
+def stats_verify(repair):
+    """Recompute the summaries from recipes and compare them with the maintained ones."""
+    drift = []
+    with get_db() as db:
+        for table, query in STATS_FROM_RECIPES.items():
+            expected = {tuple(r) for r in db.execute(query)}
+            maintained = {tuple(r) for r in db.execute(f"SELECT * FROM {table}")}
+            for row in sorted(expected ^ maintained, key=repr):
+                drift.append(f"{table}: {'missing' if row in expected else 'unexpected'} {row}")
+        if drift and repair:
+            rebuild_stats(db)
+            db.commit()
+    for line in drift:
+        click.echo(line)
+    if not drift:
+        click.echo("Stats OK.")
+    elif repair:
+        click.echo(f"Rebuilt stats ({len(drift)} mismatched row(s)).")
+    else:
+        raise click.ClickException(f"{len(drift)} mismatched row(s); rerun with --repair to rebuild.")
+
+
+@app.cli.group("snapshot")
+def snapshot_cli():
+    """Online backups of the recipes database."""
+
+
+@snapshot_cli.command("create")
+@click.option("--pages", type=click.IntRange(min=1), default=None, help="Pages copied per step.")
+@click.option("--sleep-ms", type=click.FloatRange(min=0), default=None, help="Pause between steps.")
+def snapshot_create(pages, sleep_ms):
+    """Copy the live database into SNAPSHOT_DIR without blocking the app."""
+    snap = create_snapshot(pages=pages, sleep_ms=sleep_ms)
+    click.echo(f"{snap['name']}: {snap['bytes']} bytes in {snap['ms']:.0f} ms ({snap['restarts']} restart(s)).")
+
+
+@snapshot_cli.command("list")
+def snapshot_list():
+    """Show snapshots, newest first."""
+    for snap in list_snapshots():
+        click.echo(f"{snap['name']:<40}{snap['bytes']:>12}  {snap['created_at']}")
+
+
+@snapshot_cli.command("restore")
+@click.argument("name")
+@click.option("--yes", is_flag=True, help="Do not ask for confirmation.")
+def snapshot_restore(name, yes):
+    """Verify snapshot NAME and copy it over the live database."""
+    try:
+        verify_snapshot(name)
+        if not yes:
+            click.confirm(f"Replace {DB_PATH} with {name}?", abort=True)
+        result = restore_snapshot(name)
+    except SnapshotError as exc:
+        raise click.ClickException(str(exc))
+    click.echo(f"Restored {result['restored']}; the replaced data is in {result['previous']}.")
+
+
+@app.cli.group("tenant")
+def tenant_cli():
+    """Tenant databases for TENANT_MODE."""
+
+
+@tenant_cli.command("create")
+@click.argument("name")
+def tenant_create(name):
+    """Provision (create and migrate) the database of tenant NAME."""
+    name = name.strip().lower()
+    if not TENANT_RE.match(name):
+        raise click.ClickException(f"Invalid tenant name {name!r}.")
+    init_db(TENANT_DIR / f"{name}.db")
+    click.echo(f"Tenant {name} ready at {TENANT_DIR / f'{name}.db'}.")
+
+
 if __name__ == "__main__":
     app.run(debug=True)
@@ -0,0 +1,261 @@
+# Concurrent HTTP load test against a real gunicorn server.
+#
+#   python loadtest.py --recipes 5000 --clients 32 --duration 30
+#   python loadtest.py --compare loadtest_results/<earlier run>.json
+#
+# Seeds a temporary database, starts `gunicorn Spicy_Recipe_Logger_App:app` on it,
+# drives a weighted route mix from many client threads and reports throughput
+# and p50/p95/p99 latency per route. Each run is saved as JSON for comparison.
+import argparse
+import http.client
+import json
+import math
+import os
+import random
+import sqlite3
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from datetime import datetime, UTC
+from pathlib import Path
+from urllib.parse import urlencode
+
+ROOT = Path(__file__).resolve().parent
+DEFAULT_MIX = "index=30,search=20,view=25,api=15,add=7,import=3"
+CUISINES = ["Thai", "Sichuan", "Mexican", "Ethiopian", "Korean", "Indian", "Jamaican", "Peruvian"]
+WORDS = ["chili", "garlic", "ginger", "lime", "smoky", "fiery", "tofu", "pork", "noodle", "curry"]
+
+
+def parse_mix(spec: str) -> dict:
+    mix = {}
+    for part in spec.split(","):
+        name, _, weight = part.partition("=")
+        mix[name.strip()] = float(weight or 1)
+    unknown = set(mix) - set(ROUTES)
+    if unknown:
+        raise SystemExit(f"unknown route(s) in --mix: {', '.join(sorted(unknown))}")
+    return mix
+
+
+def seed_db(path: Path, count: int):
+    os.environ["RECIPES_DB"] = str(path)
+    sys.path.insert(0, str(ROOT))
+    import Spicy_Recipe_Logger_App as appmod  # migrates the fresh file
+
+    appmod.init_db()
+    rng = random.Random(42)
+    with sqlite3.connect(path) as db:
+        db.executemany(
+            """
+            INSERT INTO recipes(title, cuisine, mood, ingredients, instructions, spice_level, rating, tags,
+                                source, created_at, vegetarian, tried)
+            VALUES (?, ?, ?, ?, ?, ?, ?, ?, 'Seed', ?, ?, ?)
+            """,
+            (
+                (
+                    f"{rng.choice(WORDS).title()} {rng.choice(WORDS)} #{i}",
+                    rng.choice(CUISINES),
+                    " ".join(rng.sample(WORDS, 3)),
+                    "\n".join(rng.sample(WORDS, 5)),
+                    "Prep\nCook\nServe",
+                    rng.randint(1, 10),
+                    rng.randint(1, 5),
+                    ",".join(rng.sample(WORDS, 2)),
+                    f"2025-01-01T00:00:{i:06d}",
+                    rng.randint(0, 1),
+                    rng.randint(0, 1),
+                )
+                for i in range(count)
+            ),
+        )
+
+
+# Each route builds (method, path, body) for one request.
+def _index(rng, ctx):
+    return "GET", "/", None
+
+
+def _search(rng, ctx):
+    return "GET", "/?" + urlencode({"q": rng.choice(WORDS)}), None
+
+
+def _view(rng, ctx):
+    return "GET", f"/recipe/{rng.randint(1, max(ctx['recipes'], 1))}", None
+
+
+def _api(rng, ctx):
+    return "GET", "/api/recipes?" + urlencode({"cuisine": rng.choice(CUISINES)}), None
+
+
+def _add(rng, ctx):
+    return "POST", "/add", urlencode({
+        "title": f"Load {rng.getrandbits(48):x}", "cuisine": rng.choice(CUISINES),
+        "spice_level": rng.randint(1, 10), "rating": rng.randint(1, 5),
+    })
+
+
+def _import(rng, ctx):
+    md = "".join(
+        f"### {n}. Load import {rng.getrandbits(48):x} ({rng.choice(CUISINES)})\n"
+        "**Mood:** busy\n\n**Ingredients:**\n- chili\n- salt\n\n**Instructions:**\n1. Cook\n2. Eat\n\n---\n"
+        for n in range(1, 4)
+    )
+    return "POST", "/import", urlencode({"md_text": md})
+
+
+ROUTES = {"index": _index, "search": _search, "view": _view, "api": _api, "add": _add, "import": _import}
+
+
+def percentile(sorted_values, pct: float):
+    if not sorted_values:
+        return None
+    # nearest-rank
+    k = max(0, math.ceil(pct / 100 * len(sorted_values)) - 1)
+    return round(sorted_values[k], 2)
+
+
+def client(port, mix, ctx, stop_at, seed, results, lock):
+    rng = random.Random(seed)
+    names, weights = list(mix), list(mix.values())
+    conn = http.client.HTTPConnection("127.0.0.1", port, timeout=30)
+    local = {name: ([], 0) for name in names}
+    while time.monotonic() < stop_at:
+        name = rng.choices(names, weights)[0]
+        method, path, body = ROUTES[name](rng, ctx)
+        headers = {"Content-Type": "application/x-www-form-urlencoded"} if body else {}
+        started = time.perf_counter()
+        try:
+            conn.request(method, path, body=body, headers=headers)
+            resp = conn.getresponse()
+            resp.read()
+            ok = resp.status < 400
+        except (OSError, http.client.HTTPException):
+            ok = False
+            conn.close()
+            conn = http.client.HTTPConnection("127.0.0.1", port, timeout=30)
+        latencies, errors = local[name]
+        if ok:
+            latencies.append((time.perf_counter() - started) * 1000)
+        local[name] = (latencies, errors + (not ok))
+    conn.close()
+    with lock:
+        for name, (latencies, errors) in local.items():
+            results[name]["latencies"].extend(latencies)
+            results[name]["errors"] += errors
+
+
+def start_server(db_path: Path, port: int, workers: int, threads: int):
+    env = dict(os.environ, RECIPES_DB=str(db_path), FLASK_DEBUG="0")
+    proc = subprocess.Popen(
+        [sys.executable, "-m", "gunicorn", "-w", str(workers), "--threads", str(threads),
+         "-b", f"127.0.0.1:{port}", "--log-level", "warning", "Spicy_Recipe_Logger_App:app"],
+        cwd=ROOT, env=env,
+    )
+    deadline = time.monotonic() + 30
+    while time.monotonic() < deadline:
+        try:
+            conn = http.client.HTTPConnection("127.0.0.1", port, timeout=1)
+            conn.request("GET", "/healthz")
+            if conn.getresponse().status == 200:
+                return proc
+        except OSError:
+            time.sleep(0.1)
+    proc.terminate()
+    raise SystemExit("gunicorn did not become healthy within 30s")
+
+
+def summarize(results, elapsed):
+    routes = {}
+    for name, r in sorted(results.items()):
+        lat = sorted(r["latencies"])
+        routes[name] = {
+            "requests": len(lat),
+            "errors": r["errors"],
+            "rps": round(len(lat) / elapsed, 1),
+            "p50_ms": percentile(lat, 50),
+            "p95_ms": percentile(lat, 95),
+            "p99_ms": percentile(lat, 99),
+        }
+    total = sum(r["requests"] for r in routes.values())
+    return {"total_rps": round(total / elapsed, 1), "total_requests": total,
+            "total_errors": sum(r["errors"] for r in routes.values()), "routes": routes}
+
+
+def _ms(v):
+    return "-" if v is None else f"{v:.1f}"
+
+
+def print_report(run, baseline=None):
+    s = run["summary"]
+    base = baseline["summary"]["routes"] if baseline else {}
+    print(f"\n{'route':<8}{'reqs':>8}{'err':>6}{'rps':>9}{'p50':>9}{'p95':>9}{'p99':>9}")
+    for name, r in s["routes"].items():
+        print(f"{name:<8}{r['requests']:>8}{r['errors']:>6}{r['rps']:>9}"
+              f"{_ms(r['p50_ms']):>9}{_ms(r['p95_ms']):>9}{_ms(r['p99_ms']):>9}")
+        if name in base:
+            b = base[name]
+            print(f"{'  (was)':<8}{b['requests']:>8}{b['errors']:>6}{b['rps']:>9}"
+                  f"{_ms(b['p50_ms']):>9}{_ms(b['p95_ms']):>9}{_ms(b['p99_ms']):>9}")
+    line = f"\ntotal: {s['total_rps']} req/s, {s['total_requests']} requests, {s['total_errors']} errors"
+    if baseline:
+        line += f" (was {baseline['summary']['total_rps']} req/s)"
+    print(line)
+
+
+def main():
+    ap = argparse.ArgumentParser(description="Load-test the app under gunicorn with a seeded temporary database.")
+    ap.add_argument("--recipes", type=int, default=2000, help="rows to seed")
+    ap.add_argument("--clients", type=int, default=16, help="concurrent client threads")
+    ap.add_argument("--duration", type=float, default=20, help="seconds to run")
+    ap.add_argument("--workers", type=int, default=2, help="gunicorn worker processes")
+    ap.add_argument("--threads", type=int, default=4, help="gunicorn threads per worker")
+    ap.add_argument("--port", type=int, default=8765)
+    ap.add_argument("--mix", default=DEFAULT_MIX, help=f"route weights (default: {DEFAULT_MIX})")
+    ap.add_argument("--out", type=Path, default=ROOT / "loadtest_results", help="directory for run JSON")
+    ap.add_argument("--label", default="", help="tag stored with the run")
+    ap.add_argument("--compare", type=Path, help="earlier run JSON to compare against")
+    args = ap.parse_args()
+
+    mix = parse_mix(args.mix)
+    baseline = json.loads(args.compare.read_text()) if args.compare else None
+    with tempfile.TemporaryDirectory() as tmp:
+        db_path = Path(tmp) / "recipes.db"
+        seed_db(db_path, args.recipes)
+        server = start_server(db_path, args.port, args.workers, args.threads)
+        try:
+            results = {name: {"latencies": [], "errors": 0} for name in mix}
+            lock = threading.Lock()
+            ctx = {"recipes": args.recipes}
+            started = time.monotonic()
+            stop_at = started + args.duration
+            clients = [
+                threading.Thread(target=client, args=(args.port, mix, ctx, stop_at, i, results, lock))
+                for i in range(args.clients)
+            ]
+            for t in clients:
+                t.start()
+            for t in clients:
+                t.join()
+            elapsed = time.monotonic() - started
+        finally:
+            server.terminate()
+            server.wait(timeout=10)
+
+    run = {
+        "label": args.label,
+        "started_at": datetime.now(UTC).isoformat(timespec="seconds"),
+        "config": {k: v for k, v in vars(args).items() if k not in ("out", "compare")},
+        "summary": summarize(results, elapsed),
+    }
+    run["config"]["mix"] = mix
+    args.out.mkdir(parents=True, exist_ok=True)
+    out_file = args.out / f"{run['started_at'].replace(':', '')}{'-' + args.label if args.label else ''}.json"
+    out_file.write_text(json.dumps(run, indent=2))
+    print_report(run, baseline)
+    print(f"saved {out_file}")
+
+
+if __name__ == "__main__":
+    main()
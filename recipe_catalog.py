@@ -0,0 +1,236 @@
+"""Compact in-process copy of the columns the recipe list filters and sorts on.
+
+Each recipe occupies a slot. Filter columns are bitsets (Python ints, bit =
+slot): veg, tried, one per cuisine (dictionary-encoded), one per spice level
+and rating value. A filter is a few ANDs/ORs and a page is read off a
+precomputed sort permutation, so answering never touches SQLite; callers fetch
+only the page's ids. The catalog follows the recipe_changes log: refresh()
+applies changes newer than the seq it was built from and reloads in full only
+after compaction or a large burst.
+"""
+import bisect
+import heapq
+import re
+import string
+import threading
+from array import array
+from typing import Dict, List, Optional, Tuple
+
+# SQLite's NOCASE folds ASCII letters only; matching it keeps catalog order == SQL order
+_NOCASE = str.maketrans(string.ascii_uppercase, string.ascii_lowercase)
+
+# sort name (as in recipe_query.SORT_KEYS) -> (sort key of a row, descending, NOCASE)
+SORTS = {
+    "created_at_desc": (lambda r: r["created_at"], True, False),
+    "title": (lambda r: r["title"].translate(_NOCASE), False, True),
+    "cuisine": (lambda r: (r["cuisine"] or "").translate(_NOCASE), False, True),
+}
+COLUMNS = "id, title, cuisine, vegetarian, tried, spice_level, rating, created_at"
+_ONES = re.compile("1")
+
+
+def _bitset(slots, size: int) -> int:
+    buf = bytearray((size + 7) // 8)
+    for s in slots:
+        buf[s >> 3] |= 1 << (s & 7)
+    return int.from_bytes(buf, "little")
+
+
+class RecipeCatalog:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.revision = -1  # recipe_changes seq reflected; -1 = not loaded
+
+    # ---- loading ----
+    def load(self, db):
+        revision = db.execute("SELECT IFNULL(MAX(seq), 0) FROM recipe_changes").fetchone()[0]
+        rows = db.execute(f"SELECT {COLUMNS} FROM recipes ORDER BY id").fetchall()
+        n = len(rows)
+        self.ids = array("q", (r["id"] for r in rows))
+        self.slot_of = {r["id"]: slot for slot, r in enumerate(rows)}
+        self.cuisine_code: Dict[Optional[str], int] = {None: 0}
+        self.cuisine = array("i", (self._code(r["cuisine"]) for r in rows))
+        # plain lists so NULL stays None: every integer is a storable spice/rating value
+        self.spice: List[Optional[int]] = [r["spice_level"] for r in rows]
+        self.rating: List[Optional[int]] = [r["rating"] for r in rows]
+
+        self.alive = (1 << n) - 1
+        self.veg = _bitset((s for s, r in enumerate(rows) if r["vegetarian"] == 1), n)
+        self.tried = _bitset((s for s, r in enumerate(rows) if r["tried"] == 1), n)
+        self.cuisine_bits = self._value_bits(self.cuisine, n)
+        self.spice_bits = self._value_bits(self.spice, n)
+        self.rating_bits = self._value_bits(self.rating, n)
+
+        self.keys = {name: [key(r) for r in rows] for name, (key, _, _) in SORTS.items()}
+        self.perm = {
+            name: sorted(range(n), key=lambda s, k=self.keys[name]: (k[s], self.ids[s]))
+            for name in SORTS
+        }
+        self.dead = 0
+        self.revision = revision
+
+    @staticmethod
+    def _value_bits(column, n: int) -> Dict[Optional[int], int]:
+        slots: Dict[Optional[int], List[int]] = {}
+        for slot, value in enumerate(column):
+            slots.setdefault(value, []).append(slot)
+        return {value: _bitset(s, n) for value, s in slots.items()}
+
+    def _code(self, cuisine: Optional[str]) -> int:
+        return self.cuisine_code.setdefault(cuisine, len(self.cuisine_code))
+
+    # ---- incremental maintenance ----
+    def refresh(self, db, max_changes: int = 5000):
+        """Catch up with the database; costs one MAX(seq) read when nothing changed."""
+        with self._lock:
+            revision = db.execute("SELECT IFNULL(MAX(seq), 0) FROM recipe_changes").fetchone()[0]
+            if revision == self.revision:
+                return
+            horizon = db.execute("SELECT compacted_through FROM change_log_state").fetchone()[0]
+            pending = revision - self.revision
+            # a lower revision means the file was replaced (snapshot restore)
+            if self.revision < 0 or pending < 0 or self.revision < horizon or pending > max_changes:
+                self.load(db)
+                return
+            cols = ", ".join(f"r.{c.strip()}" for c in COLUMNS.split(","))
+            changes = db.execute(
+                f"""
+                SELECT c.recipe_id, c.op, {cols}
+                  FROM recipe_changes c LEFT JOIN recipes r ON r.id = c.recipe_id
+                 WHERE c.seq > ? AND c.seq <= ? ORDER BY c.seq
+                """,
+                (self.revision, revision),
+            ).fetchall()
+            for ch in changes:
+                if ch["op"] == "delete" or ch["id"] is None:
+                    self._remove(ch["recipe_id"])
+                else:
+                    self._upsert(ch)
+            self.revision = revision
+            if self.dead > len(self.ids) // 2:
+                self.load(db)
+
+    def _sort_key(self, name: str, slot: int) -> Tuple:
+        return self.keys[name][slot], self.ids[slot]
+
+    def _remove(self, recipe_id: int):
+        slot = self.slot_of.pop(recipe_id, None)
+        if slot is None:
+            return
+        self._unlink(slot)
+        self.dead += 1
+
+    def _unlink(self, slot: int):
+        clear = ~(1 << slot)
+        self.alive &= clear
+        self.veg &= clear
+        self.tried &= clear
+        for bits, value in ((self.cuisine_bits, self.cuisine[slot]), (self.spice_bits, self.spice[slot]),
+                            (self.rating_bits, self.rating[slot])):
+            bits[value] &= clear
+        for name, perm in self.perm.items():
+            i = bisect.bisect_left(perm, self._sort_key(name, slot), key=lambda s, n=name: self._sort_key(n, s))
+            del perm[i]
+
+    def _upsert(self, row):
+        slot = self.slot_of.get(row["id"])
+        if slot is None:
+            slot = len(self.ids)
+            self.slot_of[row["id"]] = slot
+            self.ids.append(row["id"])
+            self.cuisine.append(0)
+            self.spice.append(None)
+            self.rating.append(None)
+            for keys in self.keys.values():
+                keys.append(None)
+        else:
+            self._unlink(slot)
+
+        bit = 1 << slot
+        self.cuisine[slot] = self._code(row["cuisine"])
+        self.spice[slot] = row["spice_level"]
+        self.rating[slot] = row["rating"]
+        self.alive |= bit
+        if row["vegetarian"] == 1:
+            self.veg |= bit
+        if row["tried"] == 1:
+            self.tried |= bit
+        for bits, value in ((self.cuisine_bits, self.cuisine[slot]), (self.spice_bits, self.spice[slot]),
+                            (self.rating_bits, self.rating[slot])):
+            bits[value] = bits.get(value, 0) | bit
+        for name, (key, _, _) in SORTS.items():
+            self.keys[name][slot] = key(row)
+            bisect.insort(self.perm[name], slot, key=lambda s, n=name: self._sort_key(n, s))
+
+    # ---- queries ----
+    @staticmethod
+    def supports(f: Dict) -> bool:
+        """Text search and date ranges are left to SQLite."""
+        return not (f["q"] or f["created_from"] or f["created_before"])
+
+    def _mask(self, f: Dict) -> int:
+        mask = self.alive
+        if f["cuisines"]:
+            any_of = 0
+            for name in f["cuisines"]:
+                code = self.cuisine_code.get(name)
+                any_of |= self.cuisine_bits.get(code, 0) if code else 0
+            mask &= any_of
+        if f["veg"]:
+            mask &= self.veg if f["veg"] == "1" else ~self.veg
+        if f["tried"]:
+            mask &= self.tried if f["tried"] == "1" else ~self.tried
+        for bits, lo, hi in ((self.spice_bits, f["spice_min"], f["spice_max"]),
+                             (self.rating_bits, f["rating_min"], f["rating_max"])):
+            if lo is None and hi is None:
+                continue
+            any_of = 0
+            for value, b in bits.items():
+                if value is not None and (lo is None or value >= lo) and (hi is None or value <= hi):
+                    any_of |= b
+            mask &= any_of
+        return mask
+
+    def query(self, f: Dict, limit: int, offset: int = 0, after=None) -> Optional[Tuple[List[int], int]]:
+        """(ids of the requested page in display order, total matches), or None if unsupported."""
+        if not self.supports(f):
+            return None
+        name = f["sort"]
+        _, desc, nocase = SORTS[name]
+        if after is not None:
+            # cursors carry SQL's raw sort_key; fold it like the stored keys
+            after = (after[0].translate(_NOCASE) if nocase else after[0], after[1])
+        with self._lock:
+            mask = self._mask(f)
+            total = mask.bit_count()
+            want = offset + limit
+            if not total or not limit:
+                return [], total
+            perm = self.perm[name]
+            keyfn = lambda s: self._sort_key(name, s)  # noqa: E731
+
+            if want * len(perm) <= total * total * 16:
+                # matches are dense: walk the permutation and test membership
+                flags = mask.to_bytes((len(self.ids) + 7) // 8, "little")
+                if desc:
+                    start = len(perm) - 1 if after is None else bisect.bisect_left(perm, after, key=keyfn) - 1
+                    order = range(start, -1, -1)
+                else:
+                    start = 0 if after is None else bisect.bisect_right(perm, after, key=keyfn)
+                    order = range(start, len(perm))
+                page = []
+                for i in order:
+                    slot = perm[i]
+                    if flags[slot >> 3] >> (slot & 7) & 1:
+                        page.append(slot)
+                        if len(page) == want:
+                            break
+            else:
+                # matches are sparse: pull them out of the bitset and rank only those
+                bits = bin(mask)[:1:-1]
+                slots = [m.start() for m in _ONES.finditer(bits)]
+                if after is not None:
+                    slots = [s for s in slots if (keyfn(s) < after if desc else keyfn(s) > after)]
+                pick = heapq.nlargest if desc else heapq.nsmallest
+                page = pick(want, slots, key=keyfn)
+            return [self.ids[s] for s in page[offset:]], total
@@ -0,0 +1,180 @@
+"""Canonical, parameterized queries for the recipe list views.
+
+index(), the carousel fragments and /api/recipes all turn request args into SQL
+here. The SQL text depends only on the *shape* of a request (which filters are
+present, the sort, the IN-list size bucket), never on the values, so the number
+of distinct statements is small and fixed and sqlite3's statement cache keeps
+hitting. Range filters and sorts line up with the indexes created by the
+`_create_list_indexes` migration.
+"""
+from datetime import date, timedelta
+from functools import lru_cache
+from typing import Dict, List, Optional, Tuple
+
+# sort name -> (key expression, collation, direction); id breaks ties so that
+# a keyset cursor always lands between two distinct rows
+SORT_KEYS = {
+    "created_at_desc": ("created_at", "", "DESC"),
+    "title": ("title", " COLLATE NOCASE", "ASC"),
+    "cuisine": ("IFNULL(cuisine, '')", " COLLATE NOCASE", "ASC"),
+}
+DEFAULT_SORT = "created_at_desc"
+
+# query-string args understood by parse(); cuisine may repeat
+FILTER_ARGS = ("q", "cuisine", "veg", "tried", "spice_min", "spice_max",
+               "rating_min", "rating_max", "created_from", "created_to", "sort")
+
+_RANGES = (
+    ("spice_level", "spice_min", "spice_max"),
+    ("rating", "rating_min", "rating_max"),
+)
+
+
+# SQLite INTEGER range; larger Python ints fail when bound
+INT64_MIN, INT64_MAX = -2 ** 63, 2 ** 63 - 1
+
+
+def _int_arg(args, name) -> Optional[int]:
+    try:
+        value = int(args.get(name, ""))
+    except ValueError:
+        return None
+    return value if INT64_MIN <= value <= INT64_MAX else None
+
+
+def _date_arg(args, name) -> Optional[date]:
+    try:
+        return date.fromisoformat(args.get(name, "").strip())
+    except ValueError:
+        return None
+
+
+def parse(args) -> Dict:
+    """Normalize request args into a filter dict; invalid values are ignored."""
+    getlist = getattr(args, "getlist", None)
+    raw_cuisines = getlist("cuisine") if getlist else [args.get("cuisine", "")]
+    cuisines = sorted({c.strip() for c in raw_cuisines if c and c.strip()})
+    created_to = _date_arg(args, "created_to")
+    return {
+        "q": args.get("q", "").strip(),
+        "cuisines": cuisines,
+        "veg": args.get("veg", "") if args.get("veg", "") in ("0", "1") else "",
+        "tried": args.get("tried", "") if args.get("tried", "") in ("0", "1") else "",
+        "spice_min": _int_arg(args, "spice_min"),
+        "spice_max": _int_arg(args, "spice_max"),
+        "rating_min": _int_arg(args, "rating_min"),
+        "rating_max": _int_arg(args, "rating_max"),
+        "created_from": _date_arg(args, "created_from"),
+        # inclusive end date -> exclusive upper bound on the ISO timestamp; date.max bounds nothing
+        "created_before": created_to + timedelta(days=1) if created_to and created_to < date.max else None,
+        "sort": args.get("sort") if args.get("sort") in SORT_KEYS else DEFAULT_SORT,
+    }
+
+
+def _bucket(n: int) -> int:
+    """Round an IN-list length up to a power of two so list sizes share statements."""
+    size = 1
+    while size < n:
+        size *= 2
+    return size
+
+
+def _shape(f: Dict) -> Tuple:
+    return (
+        bool(f["q"]),
+        _bucket(len(f["cuisines"])) if f["cuisines"] else 0,
+        bool(f["veg"]),
+        bool(f["tried"]),
+        f["spice_min"] is not None,
+        f["spice_max"] is not None,
+        f["rating_min"] is not None,
+        f["rating_max"] is not None,
+        f["created_from"] is not None,
+        f["created_before"] is not None,
+        f["sort"],
+    )
+
+
+@lru_cache(maxsize=512)
+def _compile(columns: str, shape: Tuple, keyset: bool, limited: bool, offset: bool) -> str:
+    (q, cuisines, veg, tried, spice_min, spice_max,
+     rating_min, rating_max, created_from, created_before, sort) = shape
+    expr, collate, direction = SORT_KEYS[sort]
+    wheres = []
+    if q:
+        wheres.append("(title LIKE ? OR cuisine LIKE ? OR tags LIKE ? OR mood LIKE ?)")
+    if cuisines:
+        wheres.append(f"cuisine IN ({', '.join('?' * cuisines)})")
+    if veg:
+        wheres.append("IFNULL(vegetarian, 0) = ?")
+    if tried:
+        wheres.append("IFNULL(tried, 0) = ?")
+    for (column, _, _), lo, hi in zip(_RANGES, (spice_min, rating_min), (spice_max, rating_max)):
+        if lo:
+            wheres.append(f"{column} >= ?")
+        if hi:
+            wheres.append(f"{column} <= ?")
+    if created_from:
+        wheres.append("created_at >= ?")
+    if created_before:
+        wheres.append("created_at < ?")
+    if keyset:
+        cmp = "<" if direction == "DESC" else ">"
+        wheres.append(f"({expr}{collate} {cmp} ? OR ({expr}{collate} = ? AND id {cmp} ?))")
+
+    sql = f"SELECT {columns}, {expr} AS sort_key FROM recipes"
+    if wheres:
+        sql += " WHERE " + " AND ".join(wheres)
+    sql += f" ORDER BY {expr}{collate} {direction}, id {direction}"
+    if limited:
+        sql += " LIMIT ?"
+        if offset:
+            sql += " OFFSET ?"
+    return sql
+
+
+def build(f: Dict, columns: str = "*", limit: Optional[int] = None, offset: int = 0,
+          after=None) -> Tuple[str, List]:
+    """SQL and params for the recipes matching parsed filters `f`, in display order.
+
+    `after` is a (sort_key, id) keyset cursor; rows come back with an extra
+    `sort_key` column so callers can build the next one.
+    """
+    params: List = []
+    if f["q"]:
+        params.extend([f"%{f['q']}%"] * 4)
+    if f["cuisines"]:
+        # pad with the last value so every length in a bucket binds the same statement
+        params.extend(f["cuisines"] + f["cuisines"][-1:] * (_bucket(len(f["cuisines"])) - len(f["cuisines"])))
+    if f["veg"]:
+        params.append(int(f["veg"]))
+    if f["tried"]:
+        params.append(int(f["tried"]))
+    for _, lo, hi in _RANGES:
+        if f[lo] is not None:
+            params.append(f[lo])
+        if f[hi] is not None:
+            params.append(f[hi])
+    if f["created_from"] is not None:
+        params.append(f["created_from"].isoformat())
+    if f["created_before"] is not None:
+        params.append(f["created_before"].isoformat())
+    if after is not None:
+        params.extend([after[0], after[0], after[1]])
+    if limit is not None:
+        params.append(limit)
+        if offset:
+            params.append(offset)
+    return _compile(columns, _shape(f), after is not None, limit is not None, bool(offset)), params
+
+
+@lru_cache(maxsize=64)
+def _compile_by_ids(columns: str, sort: str, size: int) -> str:
+    expr = SORT_KEYS[sort][0]
+    return f"SELECT {columns}, {expr} AS sort_key FROM recipes WHERE id IN ({', '.join('?' * size)})"
+
+
+def by_ids(ids: List[int], sort: str, columns: str = "*") -> Tuple[str, List]:
+    """SQL and params fetching a page of rows by id (order is restored by the caller)."""
+    size = _bucket(len(ids))
+    return _compile_by_ids(columns, sort, size), list(ids) + ids[-1:] * (size - len(ids))
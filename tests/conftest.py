@@ -1,5 +1,8 @@
-import pytest, gc, time
+import pytest, gc, os, tempfile, time
 from pathlib import Path
+
+# the app migrates RECIPES_DB at import; keep it away from the tracked recipes.db
+os.environ["RECIPES_DB"] = str(Path(tempfile.mkdtemp(prefix="recipes-tests-")) / "recipes.db")
 import Spicy_Recipe_Logger_App as appmod
 
 @pytest.fixture(autouse=True)
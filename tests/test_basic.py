@@ -1,5 +1,10 @@
 import json
+import re
+import sqlite3
+import pytest
+from werkzeug.datastructures import MultiDict
 import Spicy_Recipe_Logger_App as appmod
+import recipe_query
 
 def test_add_and_list():
     client = appmod.app.test_client()
@@ -14,3 +19,451 @@ def test_add_and_list():
     resp = client.get("/api/recipes")
     data = json.loads(resp.data)
     assert any(r["title"]=="Test Mapo" for r in data)
+
+
+def _insert(db, title, instructions=None, **extra):
+    row = {"title": title, "cuisine": None, "mood": None, "ingredients": None,
+           "instructions": instructions, "spice_level": None, "rating": None,
+           "tags": None, "source": "Manual", "created_at": "2025-01-01T00:00:00",
+           "vegetarian": 0, "tried": 0}
+    row.update(extra)
+    db.execute(
+        """
+        INSERT INTO recipes(title,cuisine,mood,ingredients,instructions,spice_level,rating,tags,source,created_at,vegetarian,tried)
+        VALUES(:title,:cuisine,:mood,:ingredients,:instructions,:spice_level,:rating,:tags,:source,:created_at,:vegetarian,:tried)
+        """,
+        row,
+    )
+
+
+def test_maintenance_clean_instructions_batches_and_dry_run():
+    with appmod.get_db() as db:
+        for i in range(7):
+            _insert(db, f"R{i}", "1. chop\n2) fry\n- serve")
+        _insert(db, "Clean", "chop\nfry")
+        db.commit()
+
+    runner = appmod.app.test_cli_runner()
+    result = runner.invoke(args=["maintenance", "run", "clean-instructions", "--dry-run", "--batch-size", "3"])
+    assert "Would change 7 item(s)." in result.output
+    with appmod.get_db() as db:
+        assert db.execute("SELECT instructions FROM recipes WHERE id = 1").fetchone()[0].startswith("1. ")
+
+    result = runner.invoke(args=["maintenance", "run", "clean-instructions", "--batch-size", "3"])
+    assert "Changed 7 item(s)." in result.output
+    with appmod.get_db() as db:
+        steps = {r[0] for r in db.execute("SELECT instructions FROM recipes")}
+        assert steps == {"chop\nfry\nserve", "chop\nfry"}
+        assert db.execute("SELECT COUNT(*) FROM maintenance_checkpoints").fetchone()[0] == 0
+
+
+def test_maintenance_resumes_from_checkpoint():
+    with appmod.get_db() as db:
+        for i in range(6):
+            _insert(db, f"R{i}", "1. step")
+        # pretend an earlier run committed ids 1..4 and was interrupted
+        db.execute("INSERT INTO maintenance_checkpoints VALUES ('clean-instructions', 4, 'x')")
+        db.commit()
+
+    assert appmod.run_maintenance("clean-instructions", batch_size=2) == 2
+    with appmod.get_db() as db:
+        index_count = len(appmod._recipe_indexes(db))
+    assert appmod.run_maintenance("reindex") == index_count + 1  # each index, then ANALYZE
+
+
+def test_migrations_upgrade_legacy_database(tmp_path, monkeypatch):
+    legacy = tmp_path / "legacy" / "recipes.db"
+    legacy.parent.mkdir()
+    with sqlite3.connect(legacy) as db:
+        db.execute("CREATE TABLE recipes (id INTEGER PRIMARY KEY AUTOINCREMENT, title TEXT NOT NULL, cuisine TEXT, "
+                   "mood TEXT, ingredients TEXT, instructions TEXT, spice_level INTEGER, rating INTEGER, "
+                   "tags TEXT, source TEXT, created_at TEXT NOT NULL)")
+        db.execute("INSERT INTO recipes(title, created_at) VALUES ('Old', 'x')")
+    monkeypatch.setattr(appmod, "DB_PATH", legacy)
+
+    appmod.init_db()
+    appmod.init_db()  # already current: no-op
+
+    # another connection holding the file must not stop a worker from booting
+    with sqlite3.connect(legacy, isolation_level=None) as other:
+        other.execute("PRAGMA journal_mode = delete")
+        other.execute("BEGIN")
+        other.execute("SELECT COUNT(*) FROM recipes").fetchone()
+        appmod.init_db()
+        other.execute("COMMIT")
+    appmod.init_db()
+    with sqlite3.connect(legacy) as db:
+        assert db.execute("PRAGMA journal_mode").fetchone()[0] == appmod.JOURNAL_MODE
+
+    with appmod.get_db() as db:
+        assert appmod.schema_version(db) == len(appmod.MIGRATIONS)
+        cols = {r["name"] for r in db.execute("PRAGMA table_info(recipes)")}
+        assert {"vegetarian", "tried"} <= cols
+        assert db.execute("SELECT title FROM recipes").fetchone()[0] == "Old"
+
+
+def test_stats_follow_inserts_updates_and_deletes():
+    client = appmod.app.test_client()
+    client.post("/add", data={"title": "A", "cuisine": "Thai", "spice_level": "7", "rating": "4", "tried": "on"})
+    client.post("/add", data={"title": "B", "cuisine": "Thai", "spice_level": "7", "rating": "2"})
+    client.post("/add", data={"title": "C", "spice_level": "3"})
+    client.post("/edit/2", data={"title": "B", "cuisine": "Sichuan", "spice_level": "9", "rating": "5"})
+    client.post("/delete/3")
+    client.post("/add", data={"title": "D", "cuisine": "Thai"})
+    with appmod.get_db() as db:
+        db.execute("INSERT INTO recipes(title, spice_level, created_at) VALUES ('E', -1, '2024-01-01T00:00:00')")
+        db.commit()
+
+    stats = client.get("/api/stats").get_json()
+    assert (stats["total"], stats["tried"], stats["tried_ratio"]) == (4, 1, 0.25)
+    assert {c["cuisine"]: c["avg_rating"] for c in stats["cuisines"]} == {"Thai": 4.0, "Sichuan": 5.0, None: None}
+    assert stats["spice_levels"] == [
+        {"spice_level": None, "recipes": 1},
+        {"spice_level": -1, "recipes": 1},
+        {"spice_level": 7, "recipes": 1},
+        {"spice_level": 9, "recipes": 1},
+    ]
+
+    runner = appmod.app.test_cli_runner()
+    assert "Stats OK." in runner.invoke(args=["stats", "verify"]).output
+    with appmod.get_db() as db:
+        db.execute("UPDATE stats_spice SET recipes = 5")
+        db.commit()
+    assert runner.invoke(args=["stats", "verify"]).exit_code == 1
+    runner.invoke(args=["stats", "verify", "--repair"])
+    assert "Stats OK." in runner.invoke(args=["stats", "verify"]).output
+
+
+def test_writer_group_commits_and_isolates_failing_jobs():
+    from concurrent.futures import ThreadPoolExecutor
+
+    w = appmod.DbWriter(appmod.DB_PATH, window=0.05)
+
+    def job(i):
+        if i == 3:
+            return w.submit(lambda db: db.execute("INSERT INTO recipes(title) VALUES ('no created_at')"))
+        return w.submit(lambda db: _insert(db, f"W{i}") or i)
+
+    with ThreadPoolExecutor(8) as pool:
+        futures = [pool.submit(job, i) for i in range(8)]
+    assert [f.result() for i, f in enumerate(futures) if i != 3] == [0, 1, 2, 4, 5, 6, 7]
+    with pytest.raises(sqlite3.IntegrityError):
+        futures[3].result()
+
+    stats = w.stats()
+    assert stats["jobs"] == 8 and stats["commits"] < 8
+    with appmod.get_db() as db:
+        assert db.execute("SELECT COUNT(*) FROM recipes").fetchone()[0] == 7
+
+    # a file that cannot even be opened fails each submit instead of killing the thread
+    broken = appmod.DbWriter(appmod.DB_PATH.parent / "missing" / "x.db", window=0)
+    for _ in range(2):
+        with pytest.raises(sqlite3.OperationalError):
+            broken.submit(lambda db: None)
+
+
+def test_change_feed_returns_upserts_tombstones_and_compacts(monkeypatch):
+    client = appmod.app.test_client()
+    for title in ("Keep", "Gone", "Edited"):
+        client.post("/add", data={"title": title})
+    client.post("/delete/2")
+    client.post("/edit/3", data={"title": "Edited twice"})
+
+    feed = client.get("/api/recipes/changes?since=0").get_json()
+    assert client.get(f"/api/recipes/changes?since={10 ** 30}").status_code == 400
+    assert [(c["op"], c.get("id") or c["recipe"]["id"]) for c in feed["changes"]] == [
+        ("upsert", 1), ("delete", 2), ("upsert", 3)]
+    assert feed["changes"][2]["recipe"]["title"] == "Edited twice"
+    assert client.get(f"/api/recipes/changes?since={feed['next_since']}").get_json()["changes"] == []
+
+    page = client.get("/api/recipes/changes?since=0&limit=2").get_json()
+    assert page["has_more"] and len(page["changes"]) == 2
+
+    monkeypatch.setattr(appmod, "CHANGE_RETENTION_DAYS", 0)
+    assert appmod.run_maintenance("compact-changes") == 1
+    assert client.get("/api/recipes/changes?since=1").status_code == 410
+    assert [c["op"] for c in client.get("/api/recipes/changes?since=0").get_json()["changes"]] == ["upsert", "upsert"]
+    assert len(client.get(f"/api/recipes/changes?since={feed['changes'][1]['seq']}").get_json()["changes"]) == 1
+
+
+def test_carousel_renders_first_window_and_pages_through_fragments():
+    with appmod.get_db() as db:
+        for i in range(30):
+            _insert(db, f"Dish {i % 7}", cuisine="Thai" if i % 2 else None)
+        db.commit()
+    client = appmod.app.test_client()
+
+    page = client.get("/?view=carousel&sort=title").get_data(as_text=True)
+    assert page.count("class='swiper-slide'") == appmod.CAROUSEL_WINDOW
+    next_url = re.search(r'data-next="([^"]+)"', page).group(1).replace("&amp;", "&")
+
+    seen = re.findall(r"/recipe/(\d+)'", page)
+    while next_url:
+        resp = client.get(next_url)
+        seen += re.findall(r"/recipe/(\d+)'", resp.get_data(as_text=True))
+        next_url = resp.headers["X-Next-Url"]
+    listed = re.findall(r"/recipe/(\d+)'", client.get("/?sort=title").get_data(as_text=True))
+    assert seen == listed and len(seen) == 30
+
+    assert client.get("/fragments/slides?cursor=garbage").status_code == 400
+    for bad in ([[1], 5], [{"a": 1}, 5], [5, 1], ["x", "1"], ["x", 10**30]):
+        cursor = appmod.base64.urlsafe_b64encode(json.dumps(bad).encode()).decode()
+        assert client.get(f"/fragments/slides?cursor={cursor}").status_code == 400
+
+
+def test_query_builder_ranges_multi_cuisine_and_plans():
+    with appmod.get_db() as db:
+        for i, (cuisine, spice, day) in enumerate([("Thai", 3, "01"), ("Thai", 8, "05"), ("Sichuan", 9, "10"),
+                                                    ("Mexican", 6, "15"), ("Korean", 2, "20")]):
+            _insert(db, f"R{i}", cuisine=cuisine, spice_level=spice, rating=i + 1,
+                    created_at=f"2025-03-{day}T12:00:00+00:00")
+        db.commit()
+    client = appmod.app.test_client()
+
+    rows = client.get("/api/recipes?cuisine=Thai&cuisine=Sichuan&cuisine=Mexican&spice_min=5").get_json()
+    assert sorted(r["title"] for r in rows) == ["R1", "R2", "R3"]
+    rows = client.get("/api/recipes?created_from=2025-03-05&created_to=2025-03-15&rating_max=3").get_json()
+    assert [r["title"] for r in rows] == ["R2", "R1"]
+
+    # the form offers the same filters and echoes the parsed values back
+    form = client.get("/?cuisine=Thai&cuisine=Korean&rating_max=3&created_to=2025-03-15&created_from=bogus")
+    form = form.get_data(as_text=True)
+    assert "<select name='cuisine' class='form-select' multiple" in form
+    assert re.search(r"value='Thai' selected", form) and re.search(r"value='Korean' selected", form)
+    assert "name='rating_max' type='number' min='1' max='5' value='3'" in form
+    assert "name='created_to' type='date' value='2025-03-15'" in form
+    assert "name='created_from' type='date' value=''" in form
+
+    # out-of-range values are ignored like any other invalid input
+    for args in ("created_to=9999-12-31", "spice_min=99999999999999999999999", "rating_max=-99999999999999999999"):
+        assert client.get(f"/api/recipes?{args}").status_code == 200
+        assert client.get(f"/?{args}").status_code == 200
+
+    # same shape, different values -> identical SQL; IN lists share a size bucket
+    a, _ = recipe_query.build(recipe_query.parse({"cuisine": "Thai", "spice_min": "1"}))
+    b, _ = recipe_query.build(recipe_query.parse({"cuisine": "Korean", "spice_min": "9"}))
+    assert a == b
+    three = MultiDict([("cuisine", "A"), ("cuisine", "B"), ("cuisine", "C")])
+    four = MultiDict([("cuisine", "A"), ("cuisine", "B"), ("cuisine", "C"), ("cuisine", "D")])
+    assert recipe_query.build(recipe_query.parse(three))[0] == recipe_query.build(recipe_query.parse(four))[0]
+
+    with appmod.get_db() as db:
+        for args, index in [({"spice_min": "5", "spice_max": "7", "sort": "title"}, "idx_recipes_spice"),
+                            ({"created_from": "2025-03-05"}, "idx_recipes_created_at"),
+                            ({"cuisine": "Thai"}, "idx_recipes_cuisine")]:
+            sql, params = recipe_query.build(recipe_query.parse(args))
+            plan = " ".join(r["detail"] for r in db.execute("EXPLAIN QUERY PLAN " + sql, params))
+            assert index in plan, plan
+
+
+def test_tenant_mode_routes_each_tenant_to_its_own_file(tmp_path, monkeypatch):
+    monkeypatch.setattr(appmod, "TENANT_MODE", "header")
+    monkeypatch.setattr(appmod, "TENANT_DIR", tmp_path / "tenants")
+    monkeypatch.setattr(appmod, "DB_POOL_SIZE", 2)
+    monkeypatch.setattr(appmod, "TENANT_ALLOWLIST", {"acme"})
+    assert appmod.app.test_cli_runner().invoke(args=["tenant", "create", "Globex"]).exit_code == 0
+    client = appmod.app.test_client()
+
+    client.post("/add", data={"title": "Acme dish"}, headers={"X-Tenant": "acme"})
+    client.post("/add", data={"title": "Globex dish"}, headers={"X-Tenant": "Globex"})
+
+    def titles(tenant=None):
+        headers = {"X-Tenant": tenant} if tenant else {}
+        return [r["title"] for r in client.get("/api/recipes", headers=headers).get_json()]
+
+    assert titles("acme") == ["Acme dish"]
+    assert titles("globex") == ["Globex dish"]
+    assert titles() == []
+    assert (tmp_path / "tenants" / "acme.db").exists()
+    # unprovisioned tenants get no file
+    assert client.get("/api/recipes", headers={"X-Tenant": "initech"}).status_code == 404
+    assert not (tmp_path / "tenants" / "initech.db").exists()
+    assert len(appmod._pool.conns) <= 2  # least recently used handles were closed
+    assert client.get("/api/recipes", headers={"X-Tenant": "../etc"}).status_code == 400
+
+
+def test_catalog_matches_sql_and_follows_changes(monkeypatch):
+    monkeypatch.setattr(appmod, "RECIPE_CATALOG", True)
+    monkeypatch.setattr(appmod, "_catalogs", appmod.OrderedDict())
+    with appmod.get_db() as db:
+        for i in range(40):
+            _insert(db, f"{'ab'[i % 2]}Dish {i % 7}", cuisine=[None, "Thai", "thai", "Korean"][i % 4],
+                    spice_level=i % 11 or None, rating=i % 5 + 1, vegetarian=i % 3 == 0, tried=i % 2,
+                    created_at=f"2025-04-{i % 9 + 1:02d}T00:00:00+00:00")
+        _insert(db, "Below the form's range", spice_level=-1, rating=-1)  # /add only checks min= in the browser
+        db.commit()
+    cases = [{}, {"cuisine": ["Thai", "Korean"]}, {"veg": "0", "spice_min": "3"}, {"tried": "1", "rating_max": "2"},
+             {"spice_max": "3"}, {"rating_min": "-1", "rating_max": "0"},
+             {"spice_max": "4", "veg": "1"}, {"cuisine": "Nowhere"}]
+
+    def check():
+        with appmod.get_db() as db:
+            for args in cases:
+                for sort in recipe_query.SORT_KEYS:
+                    f = recipe_query.parse(MultiDict({**args, "sort": sort}))
+                    sql, params = recipe_query.build(f)
+                    expected = [r["id"] for r in db.execute(sql, params)]
+                    assert [r["id"] for r in appmod.fetch_page(db, f, 7, offset=3)] == expected[3:10]
+                    if len(expected) > 5:
+                        sql, params = recipe_query.build(f, limit=5)
+                        cursor = db.execute(sql, params).fetchall()[-1]
+                        page = appmod.fetch_page(db, f, 50, after=(cursor["sort_key"], cursor["id"]))
+                        assert [r["id"] for r in page] == expected[5:55]
+
+    check()
+    with appmod.get_db() as db:
+        db.execute("DELETE FROM recipes WHERE id % 5 = 0")
+        db.execute("UPDATE recipes SET cuisine = 'Korean', vegetarian = 1, spice_level = 9 WHERE id % 3 = 1")
+        _insert(db, "Late", cuisine="Thai", spice_level=5, created_at="2025-05-01T00:00:00+00:00")
+        db.commit()
+    check()
+    assert appmod._catalogs[str(appmod.DB_PATH)].dead > 0  # caught up incrementally, not reloaded
+
+    monkeypatch.setattr(appmod, "CATALOG_CACHE_SIZE", 1)
+    other = appmod.DB_PATH.with_name("other.db")
+    appmod.init_db(other)
+    appmod.catalog_for(appmod.get_db(other), other)
+    assert list(appmod._catalogs) == [str(other)]  # least recently used catalog dropped
+
+    monkeypatch.setattr(appmod, "RECIPE_CATALOG", False)
+    assert appmod.app.test_client().get(f"/?page={10 ** 21}").status_code == 200
+    body = appmod.app.test_client().get("/?page=2").get_data(as_text=True)
+    assert "← Previous" in body and "Next →" not in body
+
+
+def test_profile_hook_saves_ring_buffer_and_lists_it(tmp_path, monkeypatch):
+    monkeypatch.setattr(appmod, "ADMIN_TOKEN", "s3cret")
+    monkeypatch.setattr(appmod, "PROFILE_DIR", tmp_path / "profiles")
+    monkeypatch.setattr(appmod, "PROFILE_KEEP", 2)
+    with appmod.get_db() as db:
+        _insert(db, "Profiled Curry", cuisine="Thai")
+        db.commit()
+    client = appmod.app.test_client()
+
+    assert "X-Profile" not in client.get("/?__profile=1").headers  # not an admin
+    assert client.get("/admin/profiles").status_code == 403
+
+    assert "X-Profile" not in client.get("/?__profile=1&admin_token=s3cret").headers  # header only
+    admin = {"X-Admin-Token": "s3cret"}
+    names = [client.get("/?__profile=1", headers=admin).headers["X-Profile"] for _ in range(3)]
+    assert "X-Profile" not in client.get("/?__profile=1").headers  # nothing remembered between requests
+    saved = sorted(p.name for p in (tmp_path / "profiles").iterdir())
+    assert saved == sorted(f"{n}{ext}" for n in names[1:] for ext in (".json", ".prof"))
+
+    meta = json.loads((tmp_path / "profiles" / f"{names[-1]}.json").read_text())
+    assert meta["path"] == "/?__profile=1" and meta["status"] == 200
+    assert meta["buckets"]["sql"] > 0 and meta["buckets"]["cards"] > 0 and meta["buckets"]["jinja"] > 0
+    page = client.get("/admin/profiles", headers=admin).get_data(as_text=True)
+    assert names[-1] in page and "cards " in page and "own ms" in page
+    assert client.get(f"/admin/profiles/{names[-1]}.prof", headers=admin).status_code == 200
+
+
+def test_streaming_upload_import_gzip_batches_and_limit(monkeypatch):
+    import gzip
+    import io
+
+    def section(n):
+        return (f"### {n}. Upload Dish {n} (Thai)\n**Mood:** cosy\n\n**Ingredients:**\n- chili\n\n"
+                f"**Instructions:**\n1. Cook\n\n---\n")
+
+    doc = "Preamble line\n" + "".join(section(n) for n in range(1, 8)) + section(3)  # one duplicate
+    monkeypatch.setattr(appmod, "IMPORT_BATCH_SIZE", 3)
+    client = appmod.app.test_client()
+
+    resp = client.post("/import", headers={"Accept": "application/x-ndjson"}, content_type="multipart/form-data",
+                       data={"md_file": (io.BytesIO(gzip.compress(doc.encode())), "dishes.md.gz")})
+    progress = [json.loads(line) for line in resp.get_data(as_text=True).splitlines()]
+    assert [(p["batch"], p["parsed"], p["imported"]) for p in progress] == [(1, 3, 3), (2, 6, 6), (3, 8, 7)]
+    with appmod.get_db() as db:
+        row = db.execute("SELECT cuisine, instructions FROM recipes WHERE title = 'Upload Dish 7'").fetchone()
+    assert tuple(row) == ("Thai", "Cook")
+
+    # plain (not gzipped) upload on the NDJSON path, as the import page's JS sends it
+    resp = client.post("/import", headers={"Accept": "application/x-ndjson"}, content_type="multipart/form-data",
+                       data={"md_file": (io.BytesIO((doc + section(8)).encode()), "dishes.md")})
+    progress = [json.loads(line) for line in resp.get_data(as_text=True).splitlines()]
+    assert "error" not in progress[-1] and progress[-1]["imported"] == 1
+    assert progress[-1]["bytes"] > 0
+
+    # plain upload without the NDJSON accept header redirects with a summary; everything is a duplicate now
+    resp = client.post("/import", content_type="multipart/form-data",
+                       data={"md_file": (io.BytesIO(doc.encode()), "dishes.md")}, follow_redirects=True)
+    assert "Imported 0 recipe(s) in 3 batch(es)." in resp.get_data(as_text=True)
+
+    # the decompressed size is capped too, so a small gzip cannot expand without bound
+    monkeypatch.setitem(appmod.app.config, "MAX_CONTENT_LENGTH", 400)
+    resp = client.post("/import", content_type="multipart/form-data",
+                       data={"md_file": (io.BytesIO(gzip.compress((section(9) * 20).encode())), "big.gz")},
+                       follow_redirects=True)
+    assert "Stopped after" in resp.get_data(as_text=True)
+
+
+def test_snapshots_rotate_and_restore_only_verified_copies(tmp_path, monkeypatch):
+    monkeypatch.setattr(appmod, "SNAPSHOT_DIR", tmp_path / "snapshots")
+    monkeypatch.setattr(appmod, "SNAPSHOT_KEEP", 2)
+    with appmod.get_db() as db:
+        for i in range(300):
+            _insert(db, f"Snap {i}", instructions="Stir\n" * 20)
+        db.commit()
+
+    first = appmod.create_snapshot(pages=4, sleep_ms=0)
+    with sqlite3.connect(tmp_path / "snapshots" / "default" / first["name"]) as snap:
+        assert snap.execute("SELECT COUNT(*) FROM recipes").fetchone()[0] == 300
+    with appmod.get_db() as db:
+        db.execute("DELETE FROM recipes WHERE id > 10")
+        db.commit()
+    appmod.create_snapshot()
+    appmod.create_snapshot()
+    names = [s["name"] for s in appmod.list_snapshots()]
+    assert len(names) == 2 and first["name"] not in names  # rotated away
+
+    good = names[-1]
+    data = bytearray((tmp_path / "snapshots" / "default" / good).read_bytes())
+    data[4096:] = b"\xff" * (len(data) - 4096)  # everything after the schema page is garbage
+    (tmp_path / "snapshots" / "default" / "recipes-20000101T000000000.db").write_bytes(bytes(data))
+    with pytest.raises(appmod.SnapshotError, match="failed integrity_check"):
+        appmod.restore_snapshot("recipes-20000101T000000000.db")
+    with pytest.raises(appmod.SnapshotError):
+        appmod.restore_snapshot("../recipes.db")
+
+    # a tenant that happens to be called "recipes" has its own snapshots and quota
+    monkeypatch.setattr(appmod, "TENANT_DIR", tmp_path / "tenants")
+    tenant_db = tmp_path / "tenants" / "recipes.db"
+    appmod.init_db(tenant_db)
+    assert appmod.list_snapshots(tenant_db) == []
+    with pytest.raises(appmod.SnapshotError):
+        appmod.restore_snapshot(good, tenant_db)
+    appmod.create_snapshot(tenant_db)
+    assert len(appmod.list_snapshots(tenant_db)) == 1 and len(appmod.list_snapshots()) == 3
+
+    client = appmod.app.test_client()
+    with appmod.get_db() as db:  # pooled handle stays open across the restore
+        db.execute("DELETE FROM recipes")
+        _insert(db, "After snapshot")
+        db.commit()
+        synced = client.get("/api/recipes/changes?since=0&limit=5000").get_json()["next_since"]
+        last_id = db.execute("SELECT MAX(id) FROM recipes").fetchone()[0]
+        result = appmod.restore_snapshot(good)
+        assert db.execute("SELECT COUNT(*) FROM recipes").fetchone()[0] == 10
+        _insert(db, "After restore")
+        db.commit()
+        assert db.execute("SELECT id FROM recipes WHERE title = 'After restore'").fetchone()[0] > last_id
+    assert result["previous"] in [s["name"] for s in appmod.list_snapshots()]
+    # a mirror synced before the restore must resync; a fresh sync then pages normally
+    assert client.get(f"/api/recipes/changes?since={synced}").status_code == 410
+    feed = client.get("/api/recipes/changes?since=0&limit=4").get_json()
+    assert client.get(f"/api/recipes/changes?since={feed['next_since']}").status_code == 200
+
+
+def test_profile_buckets_count_nested_cards_once():
+    from pathlib import Path
+    from types import SimpleNamespace
+    app_file = appmod.__file__
+    stats = SimpleNamespace(total_tt=0.01, stats={
+        (app_file, 1, "_carousel_slide"): (1, 1, 0.0005, 0.003, {}),
+        (app_file, 2, "_card_inner"): (1, 1, 0.0025, 0.0025, {}),
+        (str(Path("Lib", "concurrent", "futures", "_base.py")), 3, "result"): (1, 1, 0.004, 0.004, {}),
+    })
+    buckets = appmod.profile_summary(stats)["buckets"]
+    assert buckets["cards"] == 2.5
+    assert buckets["writer_wait"] == 4.0